@@ -17,33 +17,193 @@ const io = new Server(server, {
 const PORT = 3000;
 app.use(express.json());
 
+// --- Logging ---
+// Structured pino logger writing asynchronously (sync: false) so console I/O stays off the event loop.
+// LOG_LEVEL / BAILEYS_LOG_LEVEL set the initial levels; POST /log-level changes them at runtime.
+// LOG_PRETTY=1 switches to pino-pretty output (runs in a worker thread via pino.transport).
+const LOG_LEVELS = ['trace', 'debug', 'info', 'warn', 'error', 'fatal', 'silent'];
+const logger = pino(
+    { level: process.env.LOG_LEVEL || 'info' },
+    process.env.LOG_PRETTY ? pino.transport({ target: 'pino-pretty' }) : pino.destination({ sync: false })
+);
+const baileysLogger = logger.child({ module: 'baileys' }, { level: process.env.BAILEYS_LOG_LEVEL || 'warn' });
+
+// Per-key rate limit for hot-path log lines (one per vote). Allows `burst` lines per `periodMs`
+// and reports how many were suppressed when the next window opens.
+const RATE_LIMIT_BURST = 20;
+const RATE_LIMIT_PERIOD_MS = 10000;
+const rateLimitWindows = new Map();
+function rateLimitedLog(key, level, obj, msg) {
+    if (!logger.isLevelEnabled(level)) return;
+    const now = Date.now();
+    let window = rateLimitWindows.get(key);
+    if (!window || now - window.start >= RATE_LIMIT_PERIOD_MS) {
+        const suppressed = window ? window.suppressed : 0;
+        window = { start: now, emitted: 0, suppressed: 0 };
+        rateLimitWindows.set(key, window);
+        if (suppressed) obj = { ...obj, suppressed };
+    }
+    if (window.emitted >= RATE_LIMIT_BURST) {
+        window.suppressed++;
+        return;
+    }
+    window.emitted++;
+    logger[level](obj, msg);
+}
+
+app.get('/log-level', (req, res) => res.json({ success: true, level: logger.level, baileysLevel: baileysLogger.level }));
+
+app.post('/log-level', (req, res) => {
+    const { level, baileysLevel } = req.body || {};
+    if ((level && !LOG_LEVELS.includes(level)) || (baileysLevel && !LOG_LEVELS.includes(baileysLevel))) {
+        return res.status(400).json({ success: false, message: `Level must be one of: ${LOG_LEVELS.join(', ')}` });
+    }
+    if (level) logger.level = level;
+    if (baileysLevel) baileysLogger.level = baileysLevel;
+    logger.info({ level: logger.level, baileysLevel: baileysLogger.level }, 'Log levels changed');
+    res.json({ success: true, level: logger.level, baileysLevel: baileysLogger.level });
+});
+
 let sock;
 let clientReady = false;
 let qrCodeData = null;
 
 let activePolls = {}; // Store for polls sent in the current session
 
+// Change tracking for incremental sync: every create/vote gives the poll a new, increasing `rev`.
+// pollRevOrder keeps poll IDs in rev order (re-inserted on change), so pages are cut without sorting.
+let changeSeq = 0;
+let pollRevOrder = new Map(); // pollMsgId -> rev, oldest change first
+const serverEpoch = Date.now().toString(36); // Changes on restart; clients then resync from scratch
+
+// Retention: only the MAX_HOT_POLLS most recently changed polls keep their voter map and option
+// hashes in memory. Colder polls are written to POLL_SPILL_DIR (one JSON file each) and reduced to
+// their summary in activePolls; a vote or GET /poll/:id loads the full poll back.
+const MAX_HOT_POLLS = parseInt(process.env.MAX_HOT_POLLS, 10) || 200;
+const POLL_SPILL_DIR = path.join(__dirname, 'poll_spill');
+let hotOrder = new Map(); // pollMsgId -> true for polls held in full, least recently changed first
+let coldPolls = new Set(); // pollMsgIds whose full poll is on disk
+let spilling = new Map(); // pollMsgId -> full poll while its file is being written
+let spillWrites = new Map(); // pollMsgId -> last write, so writes of one poll never overlap
+let warming = new Map(); // pollMsgId -> promise of a reload in progress
+fs.rm(POLL_SPILL_DIR, { recursive: true, force: true }).catch(() => {}); // Polls do not survive a restart
+
+function markPollChanged(pollMsgId) {
+    const poll = activePolls[pollMsgId];
+    poll.rev = ++changeSeq;
+    pollRevOrder.delete(pollMsgId);
+    pollRevOrder.set(pollMsgId, poll.rev);
+    hotOrder.delete(pollMsgId);
+    hotOrder.set(pollMsgId, true);
+    enforceRetention();
+}
+
+function pollSummary(poll) {
+    // Everything except the voter map (and option hashes, only needed for counting votes)
+    const { voters, optionHashes, ...summary } = poll;
+    summary.voterCount = voters ? Object.keys(voters).length : (poll.voterCount || 0);
+    return summary;
+}
+
+function spillPath(pollMsgId) {
+    return path.join(POLL_SPILL_DIR, pollMsgId.replace(/[^A-Za-z0-9_.-]/g, '_') + '.json');
+}
+
+function enforceRetention() {
+    while (hotOrder.size > MAX_HOT_POLLS) {
+        spillPoll(hotOrder.keys().next().value); // Least recently changed first
+    }
+}
+
+function restorePoll(pollMsgId, poll) {
+    activePolls[pollMsgId] = poll;
+    coldPolls.delete(pollMsgId);
+    hotOrder.set(pollMsgId, true);
+    enforceRetention();
+}
+
+function spillPoll(pollMsgId) {
+    const poll = activePolls[pollMsgId];
+    hotOrder.delete(pollMsgId);
+    coldPolls.add(pollMsgId);
+    spilling.set(pollMsgId, poll);
+    activePolls[pollMsgId] = pollSummary(poll);
+    const data = JSON.stringify(poll);
+    const file = spillPath(pollMsgId);
+    const write = (spillWrites.get(pollMsgId) || Promise.resolve())
+        .then(() => fs.mkdir(POLL_SPILL_DIR, { recursive: true }))
+        .then(() => fs.writeFile(file + '.tmp', data))
+        .then(() => fs.rename(file + '.tmp', file)) // Atomic, a reload never sees a half-written file
+        .catch(err => {
+            logger.error({ err, pollMsgId }, 'Could not spill poll to disk; keeping it in memory');
+            if (spilling.get(pollMsgId) === poll && coldPolls.has(pollMsgId)) restorePoll(pollMsgId, poll);
+        })
+        .finally(() => {
+            if (spilling.get(pollMsgId) === poll) spilling.delete(pollMsgId);
+            if (spillWrites.get(pollMsgId) === write) spillWrites.delete(pollMsgId);
+        });
+    spillWrites.set(pollMsgId, write);
+}
+
+// Resolves to the full poll (reloading a spilled one), or null if it is unknown or unreadable
+function warmPoll(pollMsgId) {
+    if (!coldPolls.has(pollMsgId)) return Promise.resolve(activePolls[pollMsgId] || null);
+    const pending = spilling.get(pollMsgId);
+    if (pending) { // Still being written; the in-memory copy is current
+        spilling.delete(pollMsgId);
+        restorePoll(pollMsgId, pending);
+        return Promise.resolve(pending);
+    }
+    if (!warming.has(pollMsgId)) {
+        const reload = fs.readFile(spillPath(pollMsgId), 'utf8')
+            .then(text => {
+                if (!coldPolls.has(pollMsgId)) return activePolls[pollMsgId] || null; // Restored or cleared meanwhile
+                const poll = JSON.parse(text);
+                restorePoll(pollMsgId, poll);
+                return poll;
+            })
+            .catch(err => {
+                logger.error({ err, pollMsgId }, 'Could not reload spilled poll');
+                return null;
+            })
+            .finally(() => warming.delete(pollMsgId));
+        warming.set(pollMsgId, reload);
+    }
+    return warming.get(pollMsgId);
+}
+
+function clearPolls() {
+    activePolls = {};
+    pollRevOrder = new Map();
+    hotOrder = new Map();
+    coldPolls = new Set();
+    spilling = new Map();
+    spillWrites = new Map();
+    warming = new Map();
+    fs.rm(POLL_SPILL_DIR, { recursive: true, force: true }).catch(() => {});
+}
+
 function generateOptionSha256(optionText) {
     return crypto.createHash('sha256').update(Buffer.from(optionText)).digest('hex');
 }
 
 async function connectToWhatsApp() {
-    console.log('Initializing Baileys WhatsApp Client (Poll Focus)...');
+    logger.info('Initializing Baileys WhatsApp Client (Poll Focus)...');
     const { state, saveCreds } = await useMultiFileAuthState('baileys_auth_info');
     const { version, isLatest } = await fetchLatestBaileysVersion();
-    console.log(`using Baileys version ${version.join('.')}`);
+    logger.info({ version: version.join('.'), isLatest }, 'Using Baileys version');
 
     sock = makeWASocket({
         auth: state,
         printQRInTerminal: true, // QR code එක terminal එකේ පෙන්වයි
         browser: ['WhatsApp Poll Enhanced', 'Chrome', '1.0'],
-        logger: pino({ level: 'debug' }) // DEBUG level to see more logs
+        logger: baileysLogger // Level via BAILEYS_LOG_LEVEL or POST /log-level
     });
 
     sock.ev.on('connection.update', async (update) => {
         const { connection, lastDisconnect, qr } = update;
         if (connection === 'open') {
-            console.log('Baileys WhatsApp Client is ready! (Poll Focus)');
+            logger.info('Baileys WhatsApp Client is ready! (Poll Focus)');
             clientReady = true;
             qrCodeData = null;
             io.emit('client_status', 'ready');
@@ -52,12 +212,12 @@ async function connectToWhatsApp() {
             clientReady = false;
             qrCodeData = null; // Clear QR on close
             const shouldReconnect = (lastDisconnect?.error instanceof Boom)?.output?.statusCode !== DisconnectReason.loggedOut;
-            console.log('Connection closed due to ', lastDisconnect?.error, ', reconnecting ', shouldReconnect);
+            logger.warn({ err: lastDisconnect?.error, shouldReconnect }, 'Connection closed');
             io.emit('client_status', 'disconnected');
             if (shouldReconnect) {
                 connectToWhatsApp();
             } else {
-                console.log('Logged out, not reconnecting. Please delete baileys_auth_info and restart.');
+                logger.warn('Logged out, not reconnecting. Please delete baileys_auth_info and restart.');
                 // Optionally, inform GUI about permanent logout
                 io.emit('client_status', 'logged_out');
             }
@@ -66,7 +226,7 @@ async function connectToWhatsApp() {
             qrCodeData = qr;
             io.emit('qr_code', qr);
             io.emit('client_status', 'qr_pending');
-            console.log('QR code generated. Scan it.');
+            logger.info('QR code generated. Scan it.');
         }
     });
 
@@ -89,16 +249,16 @@ async function connectToWhatsApp() {
 
 
             if (!originalPollMsgKey || !originalPollMsgKey.id) {
-                console.warn("Poll update received without original poll message key ID. Skipping. Details:", JSON.stringify(originalPollMsgKey));
+                logger.warn({ pollCreationMessageKey: originalPollMsgKey }, 'Poll update received without original poll message key ID. Skipping.');
                 return;
             }
             const pollMsgId = originalPollMsgKey.id;
 
-            console.log(`Poll Update for Poll ID: ${pollMsgId} from Voter: ${voterJid}`);
+            rateLimitedLog('poll-update', 'debug', { pollMsgId, voterJid }, 'Poll update received');
             // console.log('Poll Update Raw Details:', JSON.stringify(pollUpdate, undefined, 2));
 
-            if (activePolls[pollMsgId]) {
-                const poll = activePolls[pollMsgId];
+            const poll = activePolls[pollMsgId] ? await warmPoll(pollMsgId) : null; // Spilled polls are reloaded first
+            if (poll) {
                 let selectedOptionHashes = [];
 
                 // --- TypeError නිවැරදි කිරීම මෙතන ---
@@ -107,12 +267,12 @@ async function connectToWhatsApp() {
                         if (Buffer.isBuffer(voteBuffer)) {
                             return voteBuffer.toString('hex');
                         } else {
-                            console.warn(`Item in pollUpdate.votes for poll ${pollMsgId} is not a Buffer. Item:`, voteBuffer);
+                            rateLimitedLog('vote-not-buffer', 'warn', { pollMsgId, itemType: typeof voteBuffer }, 'Item in pollUpdate.votes is not a Buffer');
                             return null;
                         }
                     }).filter(hash => hash !== null);
                 } else {
-                    console.log(`Poll update for ${pollMsgId} (voter: ${voterJid}) did not contain a valid 'votes' array or it's empty. Current votes data:`, pollUpdate.votes);
+                    rateLimitedLog('vote-missing', 'debug', { pollMsgId, voterJid }, "Poll update did not contain a valid 'votes' array or it's empty");
                 }
                 // --- නිවැරදි කිරීම අවසන් ---
 
@@ -126,7 +286,7 @@ async function connectToWhatsApp() {
                     // If selectedOptionHashes is empty, it means the voter deselected all their options (if possible)
                     // or the update didn't contain votes. We might remove their entry or handle as no vote.
                     delete poll.voters[voterJid]; // Voter retracted their vote(s)
-                    console.log(`Voter ${voterJid} retracted votes for poll ${pollMsgId}`);
+                    rateLimitedLog('vote-retracted', 'debug', { pollMsgId, voterJid }, 'Voter retracted votes');
                 }
 
                 // 2. Recalculate all results for the poll
@@ -149,10 +309,12 @@ async function connectToWhatsApp() {
                 }
                 // --- End of recalculation logic ---
 
-                console.log(`Updated poll results for ${pollMsgId}:`, poll.results);
-                console.log(`Voters for ${pollMsgId}:`, poll.voters)
+                markPollChanged(pollMsgId);
+                // Results are at most 12 numbers; the voter map is only ever logged as a count
+                rateLimitedLog('poll-results', 'debug', { pollMsgId, results: poll.results, voterCount: Object.keys(poll.voters).length }, 'Updated poll results');
                 io.emit('poll_update_to_gui', {
                     pollMsgId: pollMsgId,
+                    rev: poll.rev,
                     results: poll.results,
                     question: poll.question,
                     options: poll.options, // Pass original options array
@@ -161,7 +323,7 @@ async function connectToWhatsApp() {
                 });
 
             } else {
-                console.warn(`Received poll update for an unknown or inactive poll ID: ${pollMsgId}. Active polls:`, Object.keys(activePolls));
+                rateLimitedLog('poll-unknown', 'warn', { pollMsgId, activePollCount: Object.keys(activePolls).length }, 'Received poll update for an unknown or inactive poll ID');
             }
         }
     });
@@ -170,11 +332,14 @@ async function connectToWhatsApp() {
 connectToWhatsApp();
 
 io.on('connection', (socket) => {
-    console.log('GUI connected via Socket.IO:', socket.id);
+    logger.info({ socketId: socket.id }, 'GUI connected via Socket.IO');
     socket.emit('client_status', clientReady ? 'ready' : (qrCodeData ? 'qr_pending' : 'disconnected'));
     if (clientReady && sock.user) socket.emit('whatsapp_user', sock.user);
     if (qrCodeData) socket.emit('qr_code', qrCodeData);
-    socket.emit('initial_poll_data', activePolls); // Send all current poll data
+    // Summaries only; voter maps are fetched per poll (GET /poll/:id) when the GUI opens one
+    const pollSummaries = {};
+    for (const [pollMsgId, poll] of Object.entries(activePolls)) pollSummaries[pollMsgId] = pollSummary(poll);
+    socket.emit('initial_poll_data', pollSummaries);
 });
 
 app.get('/status', (req, res) => res.json({ status: clientReady ? 'ready' : (qrCodeData ? 'qr_pending' : 'disconnected'), qrCode: qrCodeData, user: clientReady && sock ? sock.user : null }));
@@ -222,15 +387,15 @@ app.post('/send-poll', async (req, res) => {
             selectableCount: pollMessagePayload.selectableCount,
             // messageDetails: sentMsg // Optional: store full sent message
         };
+        markPollChanged(pollMsgId);
 
-        console.log(`Poll sent successfully to ${chatId}, Msg ID: ${pollMsgId}`);
-        console.log("Active Polls now:", activePolls);
+        logger.info({ chatId, pollMsgId, activePollCount: Object.keys(activePolls).length }, 'Poll sent successfully'); // Count only; dumping every poll and voter map grows with the session
         // Emit the newly created poll data for GUI to update its list
         io.emit('new_poll_sent', { pollMsgId: pollMsgId, pollData: activePolls[pollMsgId] });
         res.json({ success: true, message: 'Poll sent successfully!', pollMsgId: pollMsgId });
 
     } catch (error) {
-        console.error('Error sending poll:', error);
+        logger.error({ err: error, chatId }, 'Error sending poll');
         res.status(500).json({ success: false, message: 'Failed to send poll.', error: error.message });
     }
 });
@@ -239,12 +404,20 @@ app.get('/get-chats', async (req, res) => {
     if (!clientReady || !sock) {
         return res.status(400).json({ success: false, message: 'Baileys WhatsApp client is not ready.' });
     }
+    // ?participants=1 also returns each group's member JIDs (used by the recipient planner).
+    // Off by default because the member lists can be large for accounts in many groups.
+    const includeParticipants = req.query.participants === '1' || req.query.participants === 'true';
     try {
         const simplifiedChats = [];
         const groups = await sock.groupFetchAllParticipating();
         for (const [jid, group] of Object.entries(groups)) {
             if (group.subject) {
-                simplifiedChats.push({ id: jid, name: group.subject, isGroup: true });
+                const members = Array.isArray(group.participants) ? group.participants : [];
+                const chat = { id: jid, name: group.subject, isGroup: true, size: group.size || members.length };
+                if (includeParticipants) {
+                    chat.participants = members.map(p => jidNormalizedUser(p.id)).filter(Boolean);
+                }
+                simplifiedChats.push(chat);
             }
         }
          // sock.contacts might not be populated immediately or in all Baileys versions by default
@@ -255,19 +428,19 @@ app.get('/get-chats', async (req, res) => {
         simplifiedChats.sort((a, b) => (a.name || "").localeCompare(b.name || ""));
         res.json({ success: true, chats: simplifiedChats });
     } catch (error) {
-        console.error('Error fetching chats:', error);
+        logger.error({ err: error }, 'Error fetching chats');
         res.status(500).json({ success: false, message: 'Failed to fetch chats.', error: error.message });
     }
 });
 
 app.post('/logout', async (req, res) => {
-    console.log('Received logout request.');
+    logger.info('Received logout request.');
     if (sock) {
         try {
             await sock.logout(); // This logs out from WhatsApp Web
-            console.log('Baileys client logged out successfully from WhatsApp.');
+            logger.info('Baileys client logged out successfully from WhatsApp.');
         } catch (error) {
-            console.error('Error during Baileys logout from WhatsApp:', error);
+            logger.error({ err: error }, 'Error during Baileys logout from WhatsApp');
         } finally {
             // Clean up local session state
             if (sock && typeof sock.end === 'function') {
@@ -276,13 +449,13 @@ app.post('/logout', async (req, res) => {
             const sessionPath = path.join(__dirname, 'baileys_auth_info');
             try {
                 await fs.rm(sessionPath, { recursive: true, force: true });
-                console.log('Session folder "baileys_auth_info" deleted.');
+                logger.info('Session folder "baileys_auth_info" deleted.');
             } catch (err) {
-                console.error('Error deleting session folder:', err.code === 'ENOENT' ? 'Session folder not found.' : err);
+                logger.error({ err }, err.code === 'ENOENT' ? 'Session folder not found.' : 'Error deleting session folder');
             }
             clientReady = false;
             qrCodeData = null;
-            activePolls = {}; // Clear active polls on logout
+            clearPolls(); // Clear active polls on logout
             sock = undefined; // Clear the sock variable
 
             io.emit('client_status', 'disconnected');
@@ -294,20 +467,51 @@ app.post('/logout', async (req, res) => {
         const sessionPath = path.join(__dirname, 'baileys_auth_info');
             try {
                 await fs.rm(sessionPath, { recursive: true, force: true });
-                console.log('Session folder "baileys_auth_info" deleted (sock was undefined).');
+                logger.info('Session folder "baileys_auth_info" deleted (sock was undefined).');
             } catch (err) {
-                console.error('Error deleting session folder (sock was undefined):', err.code === 'ENOENT' ? 'Session folder not found.' : err);
+                logger.error({ err }, err.code === 'ENOENT' ? 'Session folder not found (sock was undefined).' : 'Error deleting session folder (sock was undefined)');
             }
-        clientReady = false; qrCodeData = null; activePolls = {};
+        clientReady = false; qrCodeData = null; clearPolls();
         io.emit('client_status', 'disconnected'); io.emit('initial_poll_data', activePolls);
         res.status(400).json({ success: false, message: 'Client was not active, but attempted to clear session.' });
     }
 });
 
+// Without query parameters this returns every poll in full (original behaviour).
+//   ?limit=N   page size; polls come in change order and `nextCursor` is set while more remain
+//   ?since=REV only polls changed after REV (a previous nextCursor, or latestRev once a sync finished)
+//   ?voters=0  leave out voter maps and send voterCount instead (GET /poll/:id has the full poll)
+// Polls spilled to disk by the retention limit are always sent as summaries (voterCount, no voters).
 app.get('/get-all-poll-data', (req, res) => {
-    res.json({ success: true, polls: activePolls });
+    const { limit, since, voters } = req.query;
+    if (limit === undefined && since === undefined && voters === undefined) {
+        return res.json({ success: true, polls: activePolls });
+    }
+    const pageSize = Math.min(Math.max(parseInt(limit, 10) || 200, 1), 1000);
+    const after = parseInt(since, 10) || 0;
+    const includeVoters = voters !== '0' && voters !== 'false';
+
+    const polls = {};
+    let count = 0;
+    let lastRev = after;
+    let hasMore = false;
+    for (const [pollMsgId, rev] of pollRevOrder) {
+        if (rev <= after) continue;
+        if (count >= pageSize) { hasMore = true; break; }
+        polls[pollMsgId] = includeVoters ? activePolls[pollMsgId] : pollSummary(activePolls[pollMsgId]);
+        lastRev = rev;
+        count++;
+    }
+    res.json({ success: true, polls, nextCursor: hasMore ? lastRev : null, latestRev: changeSeq, serverEpoch });
+});
+
+app.get('/poll/:pollMsgId', async (req, res) => {
+    if (!activePolls[req.params.pollMsgId]) return res.status(404).json({ success: false, message: 'Poll not found.' });
+    const poll = await warmPoll(req.params.pollMsgId);
+    if (!poll) return res.status(500).json({ success: false, message: 'Could not load poll from disk.' });
+    res.json({ success: true, pollMsgId: req.params.pollMsgId, poll });
 });
 
 server.listen(PORT, () => {
-    console.log(`Node.js server (Poll Focus) listening on port ${PORT}`);
+    logger.info({ port: PORT }, 'Node.js server (Poll Focus) listening');
 });
@@ -0,0 +1,262 @@
+# alert_rules.py
+# Threshold / alert rules evaluated incrementally on every vote change.
+# Rules are indexed by target (a poll or a campaign), so a vote only runs the rules of the poll
+# and campaign it belongs to; polls without rules cost one dict lookup. Rules are edge
+# triggered: the action fires when the condition becomes true and the rule re-arms once it is
+# false again (no sooner than `cooldown` seconds later, so a count hovering at the line does
+# not spam). Actions run on one background thread behind a bounded queue, never on the vote path.
+#
+#   option_pct     share of votes for `option` >= threshold %, once at least `min_votes` votes are in
+#   participation  unique voters >= threshold
+#   quorum         unique voters >= threshold % of the audience (group size / campaign members)
+
+import collections
+import json
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+log = logging.getLogger(__name__)
+
+KINDS = {'option_pct': "Option share", 'participation': "Voters", 'quorum': "Quorum"}
+ACTIONS = {'notify': "Desktop notification", 'webhook': "Webhook", 'log': "Log entry"}
+TARGET_TYPES = ('poll', 'campaign')
+LOCAL_HOSTS = ('localhost', '127.0.0.1', '::1')
+WEBHOOK_TIMEOUT_S = 3
+
+
+class RuleError(ValueError):
+    pass
+
+
+def desktop_notify(title, message):
+    """Native notification via a command-line notifier (notify-send / osascript). Returns False if none worked."""
+    try:
+        if sys.platform == 'darwin':
+            script = f"display notification {json.dumps(message)} with title {json.dumps(title)}"
+            subprocess.run(['osascript', '-e', script], timeout=5, check=True, capture_output=True)
+            return True
+        if shutil.which('notify-send'):
+            subprocess.run(['notify-send', title, message], timeout=5, check=True, capture_output=True)
+            return True
+    except (OSError, subprocess.SubprocessError) as e:
+        log.debug("Desktop notification failed: %s", e)
+    return False
+
+
+class AlertRule:
+    def __init__(self, rule_id, target_type, target_id, kind, threshold, option=None, min_votes=1,
+                 action='log', webhook_url=None, label=None, enabled=True, cooldown=30.0):
+        if target_type not in TARGET_TYPES: raise RuleError(f"Unknown target type: {target_type}")
+        if kind not in KINDS: raise RuleError(f"Unknown condition: {kind}")
+        if action not in ACTIONS: raise RuleError(f"Unknown action: {action}")
+        if kind == 'option_pct' and not option: raise RuleError("An option share rule needs an option.")
+        if kind in ('option_pct', 'quorum') and not 0 < threshold <= 100: raise RuleError("Percentage must be between 0 and 100.")
+        if kind == 'participation' and threshold < 1: raise RuleError("Voter count must be at least 1.")
+        if action == 'webhook':
+            parts = urlsplit(webhook_url or '')
+            if parts.scheme not in ('http', 'https') or parts.hostname not in LOCAL_HOSTS:
+                raise RuleError("Webhooks may only target a local http(s) URL (localhost / 127.0.0.1).")
+        self.rule_id = rule_id
+        self.target_type = target_type
+        self.target_id = target_id
+        self.kind = kind
+        self.threshold = threshold
+        self.option = option
+        self.min_votes = max(1, int(min_votes or 1))
+        self.action = action
+        self.webhook_url = webhook_url
+        self.label = label or target_id
+        self.enabled = enabled
+        self.cooldown = cooldown
+        self.fire_count = 0
+
+    def evaluate(self, metrics):
+        """(matched, observed value) for metrics {'results', 'total_votes', 'voters', 'audience'}."""
+        if self.kind == 'option_pct':
+            total = metrics['total_votes']
+            if total < self.min_votes: return False, None
+            value = metrics['results'].get(self.option, 0) / total * 100
+            return value >= self.threshold, value
+        if self.kind == 'participation':
+            value = metrics['voters']
+            return value >= self.threshold, value
+        audience = metrics.get('audience')
+        if not audience: return False, None # Quorum needs a known group size
+        value = metrics['voters'] / audience * 100
+        return value >= self.threshold, value
+
+    def describe(self):
+        if self.kind == 'option_pct':
+            condition = f"\"{self.option}\" >= {self.threshold:g}% (min {self.min_votes} votes)"
+        elif self.kind == 'participation':
+            condition = f"voters >= {self.threshold:g}"
+        else:
+            condition = f"quorum >= {self.threshold:g}% of members"
+        action = ACTIONS[self.action] + (f" {self.webhook_url}" if self.action == 'webhook' else "")
+        return f"{self.target_type.title()} '{self.label}': {condition} -> {action}"
+
+    def to_dict(self):
+        return {'ruleId': self.rule_id, 'targetType': self.target_type, 'targetId': self.target_id, 'kind': self.kind,
+                'threshold': self.threshold, 'option': self.option, 'minVotes': self.min_votes, 'action': self.action,
+                'webhookUrl': self.webhook_url, 'label': self.label, 'enabled': self.enabled, 'cooldown': self.cooldown}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['ruleId'], data['targetType'], data['targetId'], data['kind'], data['threshold'],
+                   data.get('option'), data.get('minVotes', 1), data.get('action', 'log'), data.get('webhookUrl'),
+                   data.get('label'), data.get('enabled', True), data.get('cooldown', 30.0))
+
+
+class AlertEngine:
+    """Rules indexed by (target type, target ID); actions run on a background dispatcher thread."""
+
+    def __init__(self, path, on_alert=None, queue_size=1000):
+        self.path = path
+        self.on_alert = on_alert # (alert dict, notified natively: bool), called from the dispatcher thread
+        self.rules = {} # rule_id -> AlertRule
+        self._index = {} # (target_type, target_id) -> tuple of rules; replaced, never mutated, so readers need no lock
+        self._active = set() # rule_ids whose condition currently holds
+        self._last_fired = {} # rule_id -> monotonic time
+        self._lock = threading.Lock()
+        self.evaluations = 0
+        self.fired = 0
+        self.dropped = 0
+        self.recent = collections.deque(maxlen=50)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._dispatch_loop, name="alert-dispatcher", daemon=True)
+        self._thread.start()
+
+    # -- Rule management --
+    def _reindex(self):
+        index = collections.defaultdict(list)
+        for rule in self.rules.values():
+            index[(rule.target_type, rule.target_id)].append(rule)
+        self._index = {key: tuple(rules) for key, rules in index.items()}
+
+    def add_rule(self, target_type, target_id, kind, threshold, **kwargs):
+        with self._lock:
+            next_number = 1 + max((int(rid[1:]) for rid in self.rules if rid[1:].isdigit()), default=0)
+            rule = AlertRule(f"r{next_number}", target_type, target_id, kind, threshold, **kwargs)
+            self.rules[rule.rule_id] = rule
+            self._reindex()
+        return rule
+
+    def remove_rule(self, rule_id):
+        with self._lock:
+            self.rules.pop(rule_id, None)
+            self._active.discard(rule_id)
+            self._reindex()
+
+    def set_enabled(self, rule_id, enabled):
+        rule = self.rules.get(rule_id)
+        if rule:
+            rule.enabled = enabled
+            self._active.discard(rule_id) # Re-enabled rules fire again if their condition already holds
+
+    def has_rules(self, target_type, target_id):
+        return (target_type, target_id) in self._index
+
+    # -- Hot path --
+    def evaluate(self, target_type, target_id, metrics):
+        """Check the rules of one target against its latest metrics. O(rules on that target)."""
+        rules = self._index.get((target_type, target_id))
+        if not rules: return
+        now = time.monotonic()
+        for rule in rules:
+            if not rule.enabled: continue
+            self.evaluations += 1
+            matched, value = rule.evaluate(metrics)
+            if not matched:
+                self._active.discard(rule.rule_id) # Re-arm
+                continue
+            if rule.rule_id in self._active or now - self._last_fired.get(rule.rule_id, float('-inf')) < rule.cooldown:
+                continue
+            self._active.add(rule.rule_id)
+            self._last_fired[rule.rule_id] = now
+            self.fired += 1
+            rule.fire_count += 1
+            alert = {'ruleId': rule.rule_id, 'targetType': target_type, 'targetId': target_id, 'label': rule.label,
+                     'kind': rule.kind, 'option': rule.option, 'threshold': rule.threshold,
+                     'value': round(value, 2) if value is not None else None, 'voters': metrics['voters'],
+                     'totalVotes': metrics['total_votes'], 'firedAt': time.time(), 'message': self._message(rule, value)}
+            self.recent.append(alert)
+            try:
+                self._queue.put_nowait((rule, alert))
+            except queue.Full:
+                self.dropped += 1
+
+    @staticmethod
+    def _message(rule, value):
+        if rule.kind == 'option_pct':
+            return f"{rule.label}: \"{rule.option}\" reached {value:.1f}% (rule >= {rule.threshold:g}%)"
+        if rule.kind == 'participation':
+            return f"{rule.label}: {value} voters (rule >= {rule.threshold:g})"
+        return f"{rule.label}: quorum {value:.1f}% of members (rule >= {rule.threshold:g}%)"
+
+    # -- Actions --
+    def _dispatch_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None: break
+            rule, alert = item
+            notified = False
+            try:
+                if rule.action == 'log':
+                    log.warning("ALERT %s", alert['message'], extra={'fields': {'rule': rule.rule_id, 'target': alert['targetId']}})
+                elif rule.action == 'webhook':
+                    requests.post(rule.webhook_url, json=alert, timeout=WEBHOOK_TIMEOUT_S).raise_for_status()
+                elif rule.action == 'notify':
+                    notified = desktop_notify("Poll Master alert", alert['message'])
+            except Exception as e:
+                log.warning("Alert action %s for rule %s failed: %s", rule.action, rule.rule_id, e)
+            if self.on_alert:
+                try:
+                    self.on_alert(alert, notified)
+                except Exception as e:
+                    log.warning("Alert callback failed: %s", e)
+
+    def stop(self):
+        self._queue.put(None)
+
+    # -- Persistence / reporting --
+    def load(self):
+        if not os.path.exists(self.path): return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            log.error("Could not load alert rules from %s: %s", self.path, e)
+            return
+        with self._lock:
+            for entry in data.get('rules', []):
+                try:
+                    rule = AlertRule.from_dict(entry)
+                except (RuleError, KeyError) as e:
+                    log.warning("Skipping invalid alert rule %r: %s", entry.get('ruleId'), e)
+                    continue
+                self.rules[rule.rule_id] = rule
+            self._reindex()
+
+    def save(self):
+        with self._lock:
+            data = {'rules': [rule.to_dict() for rule in self.rules.values()]}
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            log.error("Could not save alert rules to %s: %s", self.path, e)
+
+    def format_stats(self):
+        return (f"Alert rules: {len(self.rules)} ({sum(1 for r in self.rules.values() if r.enabled)} enabled), "
+                f"evaluations: {self.evaluations}, fired: {self.fired}, dropped (queue full): {self.dropped}")
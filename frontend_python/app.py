@@ -1,14 +1,30 @@
 import tkinter as tk
-from tkinter import messagebox, scrolledtext, ttk, simpledialog
+from tkinter import messagebox, scrolledtext, ttk, simpledialog, filedialog
 from PIL import Image, ImageTk # Ensure Pillow is available
 import requests
 import socketio
 import threading
 import time
 import random # For anti-ban delay
+import queue
 import json
 import os
+import logging
+import argparse
+import functools
+import inspect
+from urllib.parse import quote
 import qrcode # For QR code generation
+import recipient_planner # Audience de-duplication across overlapping groups
+import event_recorder # Capture/replay of backend events + processing timings
+import poll_archive # Bounded-memory poll retention (cold polls archived to disk)
+import profiler # Sampling profiler (flamegraph output) + Tk stall watchdog
+import app_logging # Queue-backed, rate-limited structured logging
+import local_api # Read-only local HTTP/SSE results API for dashboards
+import campaigns # Combined results for one poll sent to many chats
+import backend_health # Circuit breaker + single health probe for the Node backend
+import engine_worker # Optional worker process for Socket.IO/HTTP, poll store and sends (--worker-process)
+import alert_rules # Threshold/alert rules evaluated on each vote change
 
 # --- Configuration ---
 APP_VERSION = "1.1.0"  # Application Version
@@ -19,40 +35,164 @@ NODE_API_SEND_POLL = f"{NODE_SERVER_URL}/send-poll"
 NODE_API_GET_CHATS = f"{NODE_SERVER_URL}/get-chats"
 NODE_API_LOGOUT = f"{NODE_SERVER_URL}/logout"
 NODE_API_GET_ALL_POLL_DATA = f"{NODE_SERVER_URL}/get-all-poll-data"
+NODE_API_GET_POLL = f"{NODE_SERVER_URL}/poll" # /poll/<pollMsgId>, full poll including voters
+NODE_API_LOG_LEVEL = f"{NODE_SERVER_URL}/log-level"
 
 TEMPLATES_FILE = "poll_templates.json"
+CAMPAIGNS_FILE = "poll_campaigns.json" # Multi-chat sends grouped into campaigns (tallies are rebuilt from poll data)
+ALERT_RULES_FILE = "poll_rules.json"
+
+# Poll retention: polls beyond these limits are archived to disk and kept as summary rows
+POLL_ARCHIVE_DIR = "poll_archive"
+POLL_RETENTION_MAX_POLLS = 200 # Polls kept fully in memory (with voter maps)
+POLL_RETENTION_MAX_AGE_HOURS = 24 # Archive polls with no votes/opens for this long
+POLL_RETENTION_MAX_MEMORY_MB = 50 # Estimated size cap for the in-memory poll store
+POLL_RETENTION_CHECK_INTERVAL_MS = 30000
+POLL_SYNC_PAGE_SIZE = 200 # Polls per /get-all-poll-data page; each page is shown as soon as it arrives
+
+STALL_THRESHOLD_MS = 500 # Watchdog logs the main thread stack when Tk is blocked longer than this (0 = off)
+PROFILE_SAMPLE_INTERVAL_S = 0.005 # Sampling profiler period
+
+BACKEND_FAILURE_THRESHOLD = 2 # Consecutive connection failures that open the circuit breaker
+BACKEND_PROBE_INTERVAL_S = 15 # Health probe period while the backend is up (also the max age of the cached status)
+BACKEND_PROBE_MAX_BACKOFF_S = 30 # Probe backoff cap while the backend is down
+
+WORKER_FLUSH_INTERVAL_S = 0.1 # Worker process coalesces poll updates per poll over this window
+WORKER_POLL_INTERVAL_MS = 50 # How often Tk drains the worker's message queue
+WORKER_DRAIN_BUDGET_S = 0.03 # Max time per drain, so a flood of messages never blocks Tk for long
+
+LOCAL_API_HOST = "127.0.0.1" # Local results API only listens on loopback
+LOCAL_API_DEFAULT_PORT = 8765
+# Web origins allowed to read the local API cross-origin (CORS), e.g. "http://localhost:5173"; none by default
+LOCAL_API_ALLOWED_ORIGINS = [o.strip() for o in os.environ.get("POLLMASTER_API_ORIGINS", "").split(",") if o.strip()]
+
+LOG_LEVEL = os.environ.get("POLLMASTER_LOG_LEVEL", "INFO") # Changeable at runtime from Tools > Log Level
+LOG_POLL_UPDATE_SAMPLE_RATE = 0.1 # Fraction of per-vote debug records kept (they are rate limited as well)
+
+# --- Logging ---
+app_logging.setup_logging(LOG_LEVEL)
+log = logging.getLogger("pollmaster")
 
 # --- Global Variables ---
 sio_connected = False
 chat_mapping = {} # Stores display_name -> chat_id
+chat_sizes = {} # chat_id -> member count (groups only), used for campaign participation rates
+audience_index = None # recipient_planner.AudienceIndex built from group participants (on demand)
 active_polls_data_from_server = {} # Stores {poll_msg_id: poll_data_object}
 whatsapp_client_actually_ready = False # අලුතින් එකතු කළ flag එක
+event_log = None # event_recorder.EventRecorder while a capture is running
+event_timings = event_recorder.EventTimings() # Processing time per inbound event type
+replay_mode = False # True when fed from a recording instead of a live backend (--replay)
+active_replayer = None
+sampling_profiler = None # profiler.SamplingProfiler while profiling is on
+profile_output_path = None
+stall_watchdog = None # profiler.StallWatchdog, created once root exists
+results_api = None # local_api.LocalResultsAPI while the local results API is serving
+poll_sync_cursor = 0 # latestRev of the last finished poll sync; refreshes only fetch polls changed since
+poll_sync_epoch = None # serverEpoch of that sync; a different value means the backend restarted
+poll_sync_running = False
+poll_sync_queued = None # `full` flag of a sync requested while another one was running
+poll_voter_fetches = set() # pollMsgIds whose voter maps are being fetched
+poll_list_refresh_pending = False
+campaign_store = campaigns.CampaignStore(CAMPAIGNS_FILE)
+campaign_view_refresh_pending = False
+engine = None # engine_worker.EngineWorker when running with --worker-process
+alert_engine = alert_rules.AlertEngine(ALERT_RULES_FILE, on_alert=lambda alert, notified: root.after(0, on_alert_fired, alert, notified))
+worker_poll_sync = None # Paging state of a poll sync running in the worker
+worker_send_jobs = {} # send job id -> campaign (or None) for sends running in the worker
+worker_stats = None # Latest poll store / memory figures reported by the worker
+node_health = backend_health.BackendHealth( # Callbacks are attached once root exists
+    NODE_API_STATUS, failure_threshold=BACKEND_FAILURE_THRESHOLD,
+    interval=BACKEND_PROBE_INTERVAL_S, max_backoff=BACKEND_PROBE_MAX_BACKOFF_S
+)
+poll_retention = poll_archive.RetentionManager(
+    poll_archive.PollArchive(POLL_ARCHIVE_DIR),
+    poll_archive.RetentionPolicy(POLL_RETENTION_MAX_POLLS, POLL_RETENTION_MAX_AGE_HOURS, POLL_RETENTION_MAX_MEMORY_MB)
+)
 
 # --- Socket.IO Client ---
 sio = socketio.Client(reconnection_attempts=10, reconnection_delay=3, logger=False, engineio_logger=False) # Added logger flags
 
+# --- Event instrumentation (capture + timings) ---
+def instrumented_handler(func):
+    # Records the raw Socket.IO event when a capture is running and times how long the handler takes.
+    # Must sit below @sio.event; functools.wraps keeps the name sio registers the handler under.
+    param_count = len(inspect.signature(func).parameters)
+    timing_key = f"sio:{func.__name__}"
+    @functools.wraps(func)
+    def wrapper(*args):
+        args = args[:param_count] # Newer socketio versions pass extra args (e.g. disconnect reason)
+        if event_log: event_log.record_sio(func.__name__, args)
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            event_timings.add(timing_key, time.perf_counter() - started)
+    return wrapper
+
+def timed_handler(timing_key):
+    # Same timings for functions that process HTTP responses
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                event_timings.add(timing_key, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+# --- HTTP helpers (all calls to the Node backend go through these) ---
+def http_get(url, **kwargs):
+    return _http_request("GET", url, **kwargs)
+
+def http_post(url, **kwargs):
+    return _http_request("POST", url, **kwargs)
+
+def _http_request(method, url, **kwargs):
+    if replay_mode: # Replays must never touch a live backend; callers handle this like any connection error
+        raise requests.exceptions.ConnectionError("Replay mode: no live Node backend.")
+    if engine: # Worker mode: the worker process makes the call (blocks this background thread, never Tk)
+        response = engine.request(method, url, **kwargs) # No breaker here; its probe does not run in this mode
+    else:
+        node_health.check() # Fails fast (BackendUnavailable) while the backend is known to be down
+        try:
+            response = requests.request(method, url, **kwargs)
+        except requests.exceptions.ConnectionError as e:
+            node_health.record_failure(e)
+            raise
+        node_health.record_success()
+    if event_log: event_log.record_http(method, url, response.status_code, response.text)
+    return response
+
 @sio.event
+@instrumented_handler
 def connect():
     global sio_connected
     sio_connected = True
-    print('Socket.IO connected!')
+    log.info("Socket.IO connected")
+    node_health.record_success()
     if 'status_label' in globals() and status_label.winfo_exists():
         update_status_label("Socket.IO Connected. Checking WhatsApp...", "blue")
         check_whatsapp_status() # Check WhatsApp status once socket is up
 
 @sio.event
+@instrumented_handler
 def connect_error(data):
     global sio_connected
     sio_connected = False
-    print(f"Socket.IO connection failed: {data}")
+    log.warning("Socket.IO connection failed: %s", data)
     if 'status_label' in globals() and status_label.winfo_exists():
         update_status_label(f"Socket.IO Connection Error. Retrying...", "red")
 
 @sio.event
+@instrumented_handler
 def disconnect():
     global sio_connected
     sio_connected = False
-    print('Socket.IO disconnected.')
+    log.info("Socket.IO disconnected")
+    node_health.probe_now() # Find out right away whether the whole backend went down
     if 'status_label' in globals() and status_label.winfo_exists():
         update_status_label("Socket.IO Disconnected. Retrying connection...", "orange")
     if 'qr_display_label' in globals() and qr_display_label.winfo_exists():
@@ -60,8 +200,9 @@ def disconnect():
     # Do not clear chat/poll list on temporary socket disconnect if WA might still be connected
 
 @sio.event
+@instrumented_handler
 def qr_code(qr_data_from_socket): # Renamed to avoid conflict with qrcode module
-    print(f"Received QR Code via Socket.IO.")
+    log.info("Received QR code via Socket.IO")
     if 'qr_display_label' in globals() and qr_display_label.winfo_exists():
         display_qr_code(qr_data_from_socket) # Use the received data
         update_status_label("QR Code Received. Please scan.", "#DBA800") # Dark yellow
@@ -69,9 +210,10 @@ def qr_code(qr_data_from_socket): # Renamed to avoid conflict with qrcode module
             notebook.select(connection_tab)
 
 @sio.event
+@instrumented_handler
 def client_status(status): # Server emits 'client_status'
     global whatsapp_client_actually_ready # Global විදියට declare කරන්න
-    print(f"WhatsApp Client Status from Socket.IO: {status}")
+    log.info("WhatsApp client status from Socket.IO: %s", status)
     if 'status_label' in globals() and status_label.winfo_exists():
         if status == 'ready':
             whatsapp_client_actually_ready = True # Flag එක True කරන්න
@@ -97,6 +239,12 @@ def clear_session_gui_elements():
     whatsapp_client_actually_ready = False # Logout/clear වලදී False කරන්න
     # global active_polls_data_from_server # Removed redundant global declaration
     active_polls_data_from_server = {}
+    poll_retention.last_activity.clear()
+    poll_retention.archive.clear() # Archived polls belonged to the logged out session
+    campaign_store.clear()
+    campaign_store.save()
+    schedule_campaign_view_refresh()
+    publish_poll_event('polls_reset', {'pollCount': 0})
     if 'qr_display_label' in globals() and qr_display_label.winfo_exists(): qr_display_label.config(image='', text="QR Code (Logged Out)")
     if 'poll_chat_listbox' in globals() and poll_chat_listbox.winfo_exists(): poll_chat_listbox.delete(0, tk.END)
     if 'poll_results_listbox' in globals() and poll_results_listbox.winfo_exists(): poll_results_listbox.delete(0, tk.END)
@@ -108,15 +256,18 @@ def clear_session_gui_elements():
 
 
 @sio.event
+@instrumented_handler
 def whatsapp_user(user_data): # If server sends user info
     if user_data and user_data.get('id'):
-        print(f"Connected as: {user_data.get('name') or user_data.get('id')}")
+        log.info("Connected as: %s", user_data.get('name') or user_data.get('id'))
         # Optionally display this info in the GUI
 
 @sio.event
+@instrumented_handler
 def poll_update_to_gui(data):
     global active_polls_data_from_server
-    print(f"GUI received poll_update_to_gui: {data}")
+    # Hot path during vote storms: sampled, rate limited and never prints the voter map
+    log.debug("GUI received poll_update_to_gui: %s", app_logging.summarize(data), extra={'sample_rate': LOG_POLL_UPDATE_SAMPLE_RATE})
     poll_msg_id = data.get('pollMsgId')
 
     if poll_msg_id:
@@ -130,11 +281,39 @@ def poll_update_to_gui(data):
                 'timestamp': data.get('timestamp', time.time()*1000), # Fallback timestamp
                 'selectableCount': data.get('selectableCount', 1)
             }
-             populate_poll_results_listbox() # New poll, refresh the list
+             if 'voters' not in data: # Compact update from the engine worker: count only, voter map stays there
+                 active_polls_data_from_server[poll_msg_id].update(voterCount=data.get('voterCount', 0), votersPending=True)
+                 del active_polls_data_from_server[poll_msg_id]['voters']
+             schedule_poll_list_refresh() # New poll, refresh the list
         else: # Existing poll, just update results and voters
+            if active_polls_data_from_server[poll_msg_id].get('archived'): # Cold poll got a vote, bring it back first
+                poll_retention.reload(active_polls_data_from_server, poll_msg_id)
+                active_polls_data_from_server[poll_msg_id].pop('archived', None) # In case the archive file was missing
             active_polls_data_from_server[poll_msg_id]['results'] = data.get('results', {})
-            active_polls_data_from_server[poll_msg_id]['voters'] = data.get('voters', {})
-
+            if 'voters' in data:
+                active_polls_data_from_server[poll_msg_id]['voters'] = data['voters']
+                active_polls_data_from_server[poll_msg_id].pop('votersPending', None) # The update carries the full voter map
+            else: # Compact update from the engine worker
+                poll = active_polls_data_from_server[poll_msg_id]
+                if 'voters' in poll and 'votersChanged' in data: # Keep the voter map fetched on open current
+                    for voter_jid in data.get('votersRemoved', ()):
+                        poll['voters'].pop(voter_jid, None)
+                    poll['voters'].update(data['votersChanged'])
+                elif 'voters' in poll: # The worker does not know we hold this map; fetch it again when opened
+                    poll.pop('voters')
+                    poll['votersPending'] = True
+                poll['voterCount'] = data.get('voterCount', 0) # Count for polls without a voter map
+        if 'rev' in data: active_polls_data_from_server[poll_msg_id]['rev'] = data['rev']
+        poll_retention.touch(poll_msg_id)
+        campaign = campaign_store.apply_poll(poll_msg_id, active_polls_data_from_server[poll_msg_id])
+        if campaign:
+            schedule_campaign_view_refresh()
+        # Alert rules run only for targets that have any (one dict lookup otherwise)
+        if alert_engine.has_rules('poll', poll_msg_id):
+            alert_engine.evaluate('poll', poll_msg_id, poll_alert_metrics(active_polls_data_from_server[poll_msg_id]))
+        if campaign and alert_engine.has_rules('campaign', campaign.campaign_id):
+            alert_engine.evaluate('campaign', campaign.campaign_id, campaign_alert_metrics(campaign))
+        publish_poll_event('poll_update', local_api.poll_summary(poll_msg_id, active_polls_data_from_server[poll_msg_id]))
 
         # If this poll is currently selected in the results tab, refresh its display
         if 'poll_results_listbox' in globals() and poll_results_listbox.winfo_exists():
@@ -146,18 +325,22 @@ def poll_update_to_gui(data):
                     if f"(ID: ...{poll_msg_id[-6:]})" in selected_poll_display_text:
                         display_selected_poll_results() # Refresh display
             except Exception as e:
-                print(f"Error updating selected poll display from poll_update_to_gui: {e}")
+                log.warning("Error updating selected poll display from poll_update_to_gui: %s", e)
         update_status_label(f"Poll '{active_polls_data_from_server.get(poll_msg_id, {}).get('question', poll_msg_id)}' updated!", "cyan")
 
 @sio.event
+@instrumented_handler
 def new_poll_sent(data): # Server sends { pollMsgId: 'xyz', pollData: {...} }
     global active_polls_data_from_server
-    print(f"GUI received new_poll_sent: {data}")
+    log.debug("GUI received new_poll_sent: %s", app_logging.summarize(data))
     poll_msg_id = data.get('pollMsgId')
     poll_data_obj = data.get('pollData')
     if poll_msg_id and poll_data_obj:
         active_polls_data_from_server[poll_msg_id] = poll_data_obj
-        populate_poll_results_listbox() # Refresh the listbox with the new poll
+        poll_retention.touch(poll_msg_id)
+        campaign_store.apply_poll(poll_msg_id, poll_data_obj)
+        publish_poll_event('poll_added', local_api.poll_summary(poll_msg_id, poll_data_obj))
+        schedule_poll_list_refresh() # Refresh the listbox with the new poll
         update_status_label(f"New poll '{poll_data_obj.get('question', 'N/A')}' added to results tab.", "magenta")
     else:
         # Fallback if data structure is different, refetch all
@@ -165,10 +348,19 @@ def new_poll_sent(data): # Server sends { pollMsgId: 'xyz', pollData: {...} }
 
 
 @sio.event
-def initial_poll_data(data): # When GUI connects, server sends all current poll data
+@instrumented_handler
+def initial_poll_data(data): # When GUI connects, server sends all current polls (summaries, voter maps are fetched on open)
     global active_polls_data_from_server
-    print("GUI received initial_poll_data")
-    active_polls_data_from_server = data if isinstance(data, dict) else {} # Ensure it's a dict
+    log.info("GUI received initial_poll_data (%d polls)", len(data) if isinstance(data, dict) else 0)
+    incoming = data if isinstance(data, dict) else {} # Ensure it's a dict
+    previous = active_polls_data_from_server
+    active_polls_data_from_server = {pid: previous[pid] for pid in incoming if pid in previous} # Keep voter maps we already have
+    for poll_msg_id, poll in incoming.items():
+        merge_poll_from_server(poll_msg_id, poll)
+        campaign_store.apply_poll(poll_msg_id, active_polls_data_from_server[poll_msg_id])
+    schedule_campaign_view_refresh()
+    enforce_poll_retention(repopulate=False) # Big initial payloads get trimmed straight away
+    publish_poll_event('polls_reset', {'pollCount': len(active_polls_data_from_server)})
     populate_poll_results_listbox()
     # --- නිවැරදි කළ පේළිය ---
     update_status_label(f"Loaded {len(active_polls_data_from_server)} existing polls.", "blue") # "info" වෙනුවට "blue"
@@ -180,36 +372,59 @@ def update_status_label(message, color_name="blue"): # Standardized color_name
             status_label.config(text=f"Status: {message}", fg=color_name)
             if 'root' in globals() and root.winfo_exists(): root.update_idletasks()
         except tk.TclError as e:
-            print(f"Error setting color '{color_name}': {e}. Using default.")
+            log.debug("Error setting color %r: %s. Using default.", color_name, e)
             status_label.config(text=f"Status: {message}", fg="black")
 
 
 def check_whatsapp_status():
     if 'status_label' not in globals() or not status_label.winfo_exists(): return
+    if node_health.is_open: # Known down: report it now and check again once the probe sees it back
+        update_status_label(f"Node server unreachable. Next check in {node_health.retry_in():.0f}s...", "red")
+        node_health.defer('check_whatsapp_status', check_whatsapp_status)
+        return
+    cached_status = node_health.cached_status(BACKEND_PROBE_INTERVAL_S)
+    if cached_status is not None: # The health probe fetched /status moments ago
+        apply_status_data(cached_status)
+        return
     update_status_label("Checking WhatsApp status via HTTP...", "blue")
+    if engine:
+        engine.send_command('check_status') # Answered with 'status_data' (or a 'status' line on failure)
+        return
     try:
-        response = requests.get(NODE_API_STATUS, timeout=3) # Shorter timeout
+        response = http_get(NODE_API_STATUS, timeout=3) # Shorter timeout
         response.raise_for_status()
-        data = response.json()
-        api_status = data.get('status')
-        api_qr = data.get('qrCode')
-        # This HTTP check is a fallback; primary updates should come via Socket.IO client_status event
-        if api_status == 'ready':
-            # client_status('ready') # Let socket event handle this primarily
-            if not sio_connected: update_status_label("HTTP: WA Ready (Socket disconnected)", "orange")
-            else: update_status_label("HTTP: WA Ready (Socket connected)", "green")
-        elif api_status == 'qr_pending' and api_qr:
-            # client_status('qr_pending') # Let socket event handle this
-            # display_qr_code(api_qr)
-             if not sio_connected: update_status_label("HTTP: WA QR Pending (Socket disconnected)", "orange")
-
-        elif api_status == 'disconnected':
-            # client_status('disconnected')
-            if not sio_connected: update_status_label("HTTP: WA Disconnected (Socket disconnected)", "red")
-
+        apply_status_data(response.json())
     except requests.exceptions.RequestException as e:
         update_status_label(f"Node server check failed: {type(e).__name__}", "red")
-        print(f"HTTP status check failed: {e}")
+        log.warning("HTTP status check failed: %s", e)
+
+
+def on_backend_health_changed(available):
+    if available:
+        update_status_label("Node server reachable again.", "green")
+        if not sio.connected: check_whatsapp_status()
+    else:
+        update_status_label(f"Node server unreachable. Retrying in the background (next check in {node_health.retry_in():.0f}s)...", "red")
+    refresh_diagnostics()
+
+
+@timed_handler("http:/status")
+def apply_status_data(data):
+    api_status = data.get('status')
+    api_qr = data.get('qrCode')
+    # This HTTP check is a fallback; primary updates should come via Socket.IO client_status event
+    if api_status == 'ready':
+        # client_status('ready') # Let socket event handle this primarily
+        if not sio_connected: update_status_label("HTTP: WA Ready (Socket disconnected)", "orange")
+        else: update_status_label("HTTP: WA Ready (Socket connected)", "green")
+    elif api_status == 'qr_pending' and api_qr:
+        # client_status('qr_pending') # Let socket event handle this
+        # display_qr_code(api_qr)
+         if not sio_connected: update_status_label("HTTP: WA QR Pending (Socket disconnected)", "orange")
+
+    elif api_status == 'disconnected':
+        # client_status('disconnected')
+        if not sio_connected: update_status_label("HTTP: WA Disconnected (Socket disconnected)", "red")
 
 
 def display_qr_code(qr_data_str):
@@ -231,7 +446,7 @@ def display_qr_code(qr_data_str):
     except Exception as e:
         update_status_label(f"Error displaying QR: {e}", "red")
         qr_display_label.config(image='', text=f"QR Display Error: {e}")
-        print(f"QR display error: {e}")
+        log.error("QR display error: %s", e)
 
 
 def fetch_chats():
@@ -242,35 +457,46 @@ def fetch_chats():
         return
 
     update_status_label("Fetching chats...", "blue")
+    if engine:
+        engine.send_command('fetch_chats') # Answered with a 'chats' message
+        return
     try:
-        response = requests.get(NODE_API_GET_CHATS, timeout=10)
+        response = http_get(NODE_API_GET_CHATS, timeout=10)
         response.raise_for_status()
-        data = response.json()
-        if data.get('success'):
-            listboxes_to_update = []
-            if 'poll_chat_listbox' in globals() and poll_chat_listbox.winfo_exists():
-                listboxes_to_update.append(poll_chat_listbox)
-
-            for lb in listboxes_to_update: lb.delete(0, tk.END)
-            chat_mapping.clear()
-            fetched_chats_count = 0
-            if 'chats' in data and data['chats'] is not None:
-                for chat in data['chats']:
-                    display_name = f"{chat.get('name', 'Unknown Name')} ({'Group' if chat.get('isGroup') else 'Contact'})"
-                    chat_id_val = chat.get('id')
-                    if chat_id_val: # Ensure chat_id is not None or empty
-                        chat_mapping[display_name] = chat_id_val
-                        for lb in listboxes_to_update: lb.insert(tk.END, display_name)
-                        fetched_chats_count +=1
-            update_status_label(f"Fetched {fetched_chats_count} chats.", "green")
-        else:
-            update_status_label(f"Failed to fetch chats: {data.get('message', 'No message')}", "red")
+        apply_chats_data(response.json())
+    except backend_health.BackendUnavailable:
+        node_health.defer('fetch_chats', fetch_chats)
+        update_status_label("Node server unreachable; chats will be fetched when it is back.", "orange")
     except requests.exceptions.RequestException as e:
         update_status_label(f"Error fetching chats (HTTP): {e}", "red")
-        print(f"Fetch chats error: {e}")
+        log.warning("Fetch chats error: %s", e)
     except Exception as e: # Catch other potential errors
         update_status_label(f"Unexpected error fetching chats: {e}", "red")
-        print(f"Unexpected fetch chats error: {e}")
+        log.exception("Unexpected fetch chats error: %s", e)
+
+@timed_handler("http:/get-chats")
+def apply_chats_data(data):
+    if data.get('success'):
+        listboxes_to_update = []
+        if 'poll_chat_listbox' in globals() and poll_chat_listbox.winfo_exists():
+            listboxes_to_update.append(poll_chat_listbox)
+
+        for lb in listboxes_to_update: lb.delete(0, tk.END)
+        chat_mapping.clear()
+        chat_sizes.clear()
+        fetched_chats_count = 0
+        if 'chats' in data and data['chats'] is not None:
+            for chat in data['chats']:
+                display_name = f"{chat.get('name', 'Unknown Name')} ({'Group' if chat.get('isGroup') else 'Contact'})"
+                chat_id_val = chat.get('id')
+                if chat_id_val: # Ensure chat_id is not None or empty
+                    chat_mapping[display_name] = chat_id_val
+                    if chat.get('size'): chat_sizes[chat_id_val] = chat['size']
+                    for lb in listboxes_to_update: lb.insert(tk.END, display_name)
+                    fetched_chats_count +=1
+        update_status_label(f"Fetched {fetched_chats_count} chats.", "green")
+    else:
+        update_status_label(f"Failed to fetch chats: {data.get('message', 'No message')}", "red")
 
 def client_is_ready(): # Helper
     global whatsapp_client_actually_ready
@@ -278,7 +504,12 @@ def client_is_ready(): # Helper
     return whatsapp_client_actually_ready
 
 # --- Poll Sender Functions ---
-def send_poll_message():
+def get_selected_chat_ids():
+    if 'poll_chat_listbox' not in globals() or not poll_chat_listbox.winfo_exists(): return []
+    selected_chat_display_names = [poll_chat_listbox.get(i) for i in poll_chat_listbox.curselection()]
+    return [chat_mapping[name] for name in selected_chat_display_names if name in chat_mapping]
+
+def send_poll_message(chat_ids=None): # chat_ids given by the recipient planner, otherwise the listbox selection is used
     if 'poll_question_entry' not in globals(): return
     if not client_is_ready():
         messagebox.showerror("Error", "WhatsApp client is not ready to send polls.")
@@ -286,27 +517,31 @@ def send_poll_message():
 
     question = poll_question_entry.get().strip()
     options = [opt.strip() for opt in poll_options_listbox.get(0, tk.END) if opt.strip()] # Ensure no empty options
-    selected_indices = poll_chat_listbox.curselection()
     allow_multiple = allow_multiple_answers_var.get()
 
     if not question: messagebox.showerror("Error", "Poll question cannot be empty."); return
     if not options or len(options) < 1: messagebox.showerror("Error", "Poll must have at least one option."); return
     if len(options) > 12: messagebox.showerror("Error", "Maximum of 12 poll options allowed by WhatsApp."); return
-    if not selected_indices: messagebox.showerror("Error", "Please select at least one chat/group to send the poll to."); return
+    if chat_ids is None and not poll_chat_listbox.curselection(): messagebox.showerror("Error", "Please select at least one chat/group to send the poll to."); return
 
-    selected_chat_display_names = [poll_chat_listbox.get(i) for i in selected_indices]
-    selected_chat_ids = [chat_mapping[name] for name in selected_chat_display_names if name in chat_mapping]
+    selected_chat_ids = list(chat_ids) if chat_ids is not None else get_selected_chat_ids()
 
     if not selected_chat_ids: messagebox.showerror("Error", "No valid chats selected (ID mapping failed). Please refresh chats."); return
     if not messagebox.askyesno("Confirm Poll Submission", f"Are you sure you want to send this poll to {len(selected_chat_ids)} selected chat(s)?"): return
 
     update_status_label(f"Initiating poll send to {len(selected_chat_ids)} chat(s)...", "blue")
     # Non-blocking send using a thread
-    threading.Thread(target=_send_polls_threaded, args=(selected_chat_ids, question, options, allow_multiple), daemon=True).start()
+    if engine:
+        start_worker_send(selected_chat_ids, question, options, allow_multiple)
+    else:
+        threading.Thread(target=_send_polls_threaded, args=(selected_chat_ids, question, options, allow_multiple), daemon=True).start()
 
-def _send_polls_threaded(chat_ids, question, options, allow_multiple_bool):
+def _send_polls_threaded(chat_ids, question, options, allow_multiple_bool, campaign=None): # campaign is passed when a queued send resumes
     success_count = 0
     fail_count = 0
+    chat_names = {chat_id: name for name, chat_id in chat_mapping.items()}
+    if campaign is None and len(chat_ids) > 1:
+        campaign = campaign_store.create(question, options) # One rollup per multi-chat send
     for i, chat_id in enumerate(chat_ids):
         current_status_msg = f"Sending poll ({i+1}/{len(chat_ids)}) to {chat_id}..."
         root.after(0, update_status_label, current_status_msg, "cyan") # Update GUI from thread
@@ -317,12 +552,14 @@ def _send_polls_threaded(chat_ids, question, options, allow_multiple_bool):
                 "options": options,
                 "allowMultipleAnswers": allow_multiple_bool
             }
-            response = requests.post(NODE_API_SEND_POLL, json=payload, timeout=15) # Increased timeout slightly
+            response = http_post(NODE_API_SEND_POLL, json=payload, timeout=15) # Increased timeout slightly
             response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
             result = response.json()
 
             if result.get('success'):
                 success_count += 1
+                if campaign and result.get('pollMsgId'):
+                    root.after(0, add_poll_to_campaign, campaign.campaign_id, result['pollMsgId'], chat_id, chat_names.get(chat_id))
                 final_msg_for_chat = f"Poll sent to {chat_id} (ID: {result.get('pollMsgId', 'N/A')})"
                 root.after(0, update_status_label, final_msg_for_chat, "green")
             else:
@@ -336,22 +573,303 @@ def _send_polls_threaded(chat_ids, question, options, allow_multiple_bool):
             fail_count +=1
             err_msg = f"HTTP Error poll to {chat_id}: {httperr.response.status_code} - {httperr.response.text}"
             root.after(0, update_status_label, err_msg, "red")
-            print(err_msg)
+            log.warning("Poll send failed: %s", err_msg)
         except requests.exceptions.RequestException as reqerr: # Timeout, ConnectionError etc.
-            fail_count += 1
+            if isinstance(reqerr, requests.exceptions.ConnectionError) and not replay_mode:
+                # Keep the chats not sent yet for when the backend is back, whatever the breaker says right
+                # now (it may not have tripped yet). This chat is only among them if its request provably
+                # never left; an aborted/reset connection may already have sent the poll.
+                never_sent = backend_health.request_never_sent(reqerr)
+                if not never_sent:
+                    fail_count += 1
+                    log.warning("Poll send to %s failed mid-request, not resending: %s", chat_id, reqerr)
+                remaining = chat_ids[i:] if never_sent else chat_ids[i + 1:]
+                if remaining:
+                    if not node_health.is_open: # Give the probe a chance to confirm before retrying
+                        node_health.probe_now()
+                        time.sleep(node_health.probe_timeout + node_health.min_backoff)
+                    queued = node_health.defer(f"send:{id(remaining)}", functools.partial(
+                        threading.Thread(target=_send_polls_threaded, args=(remaining, question, options, allow_multiple_bool, campaign), daemon=True).start))
+                    root.after(0, update_status_label, f"Node server unreachable. {len(remaining)} poll send(s) "
+                                                       f"{'queued until it is back' if queued else 'being retried'} "
+                                                       f"(sent so far: {success_count}, failed: {fail_count}).", "orange")
+                    log.warning("Backend unreachable during send; %d chat(s) %s", len(remaining), "queued" if queued else "retried")
+                    return
+                if not never_sent: continue # Last chat: counted above, the summary follows
+            fail_count += 1 # ReadTimeout etc.: the poll may have gone out, so it is never resent
             err_msg = f"Request Error poll to {chat_id}: {reqerr}"
             root.after(0, update_status_label, err_msg, "red")
-            print(err_msg)
+            log.warning("Poll send failed: %s", err_msg)
         except Exception as e: # Other unexpected errors
             fail_count +=1
             err_msg = f"Unexpected Error poll to {chat_id}: {e}"
             root.after(0, update_status_label, err_msg, "red")
-            print(err_msg)
+            log.warning("Poll send failed: %s", err_msg)
 
     final_summary = f"Poll sending finished. Success: {success_count}, Failed: {fail_count}."
+    if campaign:
+        root.after(0, finish_campaign_send, campaign.campaign_id)
     root.after(0, update_status_label, final_summary, "blue" if fail_count == 0 else "orange")
 
 
+# --- Campaigns ---
+def add_poll_to_campaign(campaign_id, poll_msg_id, chat_id, chat_name):
+    campaign_store.add_poll(campaign_id, poll_msg_id, chat_id, chat_name, chat_sizes.get(chat_id))
+    # new_poll_sent usually arrives before the send response; fold in what we already have
+    campaign_store.apply_poll(poll_msg_id, active_polls_data_from_server.get(poll_msg_id))
+    schedule_campaign_view_refresh()
+
+def finish_campaign_send(campaign_id):
+    campaign = campaign_store.campaigns.get(campaign_id)
+    if campaign and not campaign.members: # Every send failed
+        campaign_store.delete(campaign_id)
+    campaign_store.save()
+    schedule_campaign_view_refresh()
+
+def schedule_campaign_view_refresh():
+    # Coalesced like the poll list: a vote storm redraws the Campaigns tab a few times per second at most
+    global campaign_view_refresh_pending
+    if campaign_view_refresh_pending or 'root' not in globals(): return
+    campaign_view_refresh_pending = True
+    root.after(250, _run_campaign_view_refresh)
+
+def _run_campaign_view_refresh():
+    global campaign_view_refresh_pending
+    campaign_view_refresh_pending = False
+    populate_campaign_listbox()
+
+def get_selected_campaign_id():
+    if 'campaign_listbox' not in globals() or not campaign_listbox.winfo_exists(): return None
+    selected_indices = campaign_listbox.curselection()
+    if not selected_indices: return None
+    ordered = campaign_store.sorted_campaigns()
+    return ordered[selected_indices[0]].campaign_id if selected_indices[0] < len(ordered) else None
+
+def populate_campaign_listbox():
+    if 'campaign_listbox' not in globals() or not campaign_listbox.winfo_exists(): return
+    selected_campaign_id = get_selected_campaign_id() # Keep the selection across refreshes
+    campaign_listbox.delete(0, tk.END)
+    for campaign in campaign_store.sorted_campaigns():
+        question = campaign.question
+        campaign_listbox.insert(tk.END, f"{question[:50]}{'...' if len(question) > 50 else ''} "
+                                        f"({len(campaign.members)} chats, {campaign.total_voters} voters)")
+        if campaign.campaign_id == selected_campaign_id: campaign_listbox.selection_set(tk.END)
+    display_selected_campaign()
+
+def display_selected_campaign(event=None):
+    if 'campaign_results_text' not in globals() or not campaign_results_text.winfo_exists(): return
+    campaign = campaign_store.campaigns.get(get_selected_campaign_id())
+    campaign_results_text.config(state=tk.NORMAL)
+    campaign_results_text.delete('1.0', tk.END)
+    if campaign:
+        campaign_results_text.insert('1.0', campaign.format_report())
+    elif campaign_store.campaigns:
+        campaign_results_text.insert('1.0', "Select a campaign to see its combined results.")
+    else:
+        campaign_results_text.insert('1.0', "No campaigns yet. Sending one poll to several chats creates a campaign.")
+    campaign_results_text.config(state=tk.DISABLED)
+
+def delete_selected_campaign():
+    campaign_id = get_selected_campaign_id()
+    if not campaign_id: return
+    if not messagebox.askyesno("Delete Campaign", "Delete this campaign? The individual polls are kept.", parent=root): return
+    campaign_store.delete(campaign_id)
+    campaign_store.save()
+    populate_campaign_listbox()
+
+
+# --- Alert Rules ---
+RULE_KIND_CHOICES = {"Option share >= %": 'option_pct', "Voters >= N": 'participation', "Quorum >= % of members": 'quorum'}
+RULE_ACTION_CHOICES = {label: action for action, label in alert_rules.ACTIONS.items()}
+
+def poll_alert_metrics(poll):
+    results = poll.get('results') or {}
+    return {'results': results, 'total_votes': sum(results.values()), 'voters': campaigns.poll_voter_count(poll),
+            'audience': chat_sizes.get(poll.get('chatId'))}
+
+def campaign_alert_metrics(campaign):
+    return {'results': campaign.totals, 'total_votes': campaign.total_votes, 'voters': campaign.total_voters,
+            'audience': campaign.audience_size}
+
+def on_alert_fired(alert, notified):
+    update_status_label(f"🔔 {alert['message']}", "magenta")
+    rule = alert_engine.rules.get(alert['ruleId'])
+    if rule and rule.action == 'notify' and not notified: # No native notifier available: small in-app popup instead
+        show_alert_toast(alert['message'])
+    populate_rules_view()
+
+def show_alert_toast(message):
+    toast = tk.Toplevel(root)
+    toast.title("Poll Master alert")
+    toast.attributes("-topmost", True)
+    ttk.Label(toast, text=f"🔔 {message}", font=bold_font, wraplength=360).pack(padx=15, pady=(15,10))
+    ttk.Button(toast, text="OK", command=toast.destroy, style="Small.TButton").pack(pady=(0,10))
+    toast.after(10000, lambda: toast.winfo_exists() and toast.destroy())
+
+def add_rule_for_selected_poll():
+    poll_msg_id = get_selected_poll_id()
+    poll = active_polls_data_from_server.get(poll_msg_id) if poll_msg_id else None
+    if not poll:
+        messagebox.showinfo("Alert Rules", "Select a poll in the Poll Results tab first.")
+        return
+    open_rule_dialog('poll', poll_msg_id, poll.get('question', poll_msg_id), poll.get('options', []))
+
+def add_rule_for_selected_campaign():
+    campaign = campaign_store.campaigns.get(get_selected_campaign_id())
+    if not campaign:
+        messagebox.showinfo("Alert Rules", "Select a campaign in the Campaigns tab first.")
+        return
+    open_rule_dialog('campaign', campaign.campaign_id, campaign.question, campaign.options)
+
+def open_rule_dialog(target_type, target_id, label, options):
+    dialog = tk.Toplevel(root)
+    dialog.title("New Alert Rule")
+    dialog.transient(root)
+    form = ttk.Frame(dialog, padding=15)
+    form.pack(fill=tk.BOTH, expand=True)
+    ttk.Label(form, text=f"{target_type.title()}: {label[:60]}", font=bold_font).grid(row=0, column=0, columnspan=2, sticky=tk.W, pady=(0,10))
+
+    kind_var = tk.StringVar(value=next(iter(RULE_KIND_CHOICES)))
+    option_var = tk.StringVar(value=options[0] if options else "")
+    threshold_var = tk.StringVar(value="50")
+    min_votes_var = tk.StringVar(value="10")
+    action_var = tk.StringVar(value=alert_rules.ACTIONS['notify'])
+    webhook_var = tk.StringVar(value="http://127.0.0.1:8080/poll-alert")
+    fields = [
+        ("Condition:", ttk.Combobox(form, textvariable=kind_var, values=list(RULE_KIND_CHOICES), state="readonly", width=30)),
+        ("Option:", ttk.Combobox(form, textvariable=option_var, values=options, state="readonly", width=30)),
+        ("Threshold (% or voters):", ttk.Entry(form, textvariable=threshold_var, width=10)),
+        ("Min votes (option share):", ttk.Entry(form, textvariable=min_votes_var, width=10)),
+        ("Action:", ttk.Combobox(form, textvariable=action_var, values=list(RULE_ACTION_CHOICES), state="readonly", width=30)),
+        ("Webhook URL (local):", ttk.Entry(form, textvariable=webhook_var, width=34)),
+    ]
+    for row, (text, widget) in enumerate(fields, start=1):
+        ttk.Label(form, text=text, font=label_font).grid(row=row, column=0, sticky=tk.W, padx=(0,8), pady=3)
+        widget.grid(row=row, column=1, sticky=tk.W, pady=3)
+
+    def save_rule():
+        kind = RULE_KIND_CHOICES[kind_var.get()]
+        action = RULE_ACTION_CHOICES[action_var.get()]
+        try:
+            threshold = float(threshold_var.get())
+            min_votes = int(min_votes_var.get() or 1)
+            rule = alert_engine.add_rule(target_type, target_id, kind, threshold,
+                                         option=option_var.get() if kind == 'option_pct' else None, min_votes=min_votes,
+                                         action=action, webhook_url=webhook_var.get().strip() if action == 'webhook' else None,
+                                         label=label[:60])
+        except ValueError as e: # RuleError is a ValueError, as are bad numbers
+            messagebox.showerror("Alert Rules", f"Invalid rule: {e}", parent=dialog)
+            return
+        alert_engine.save()
+        dialog.destroy()
+        populate_rules_view()
+        update_status_label(f"Alert rule added: {rule.describe()}", "green")
+
+    button_frame = ttk.Frame(form)
+    button_frame.grid(row=len(fields) + 1, column=0, columnspan=2, pady=(12,0))
+    ttk.Button(button_frame, text="✔ Add Rule", command=save_rule, style="Bold.TButton").pack(side=tk.LEFT, padx=5)
+    ttk.Button(button_frame, text="Cancel", command=dialog.destroy, style="Small.TButton").pack(side=tk.LEFT, padx=5)
+
+def get_selected_rule_id():
+    if 'rules_listbox' not in globals() or not rules_listbox.winfo_exists(): return None
+    selected_indices = rules_listbox.curselection()
+    rule_ids = list(alert_engine.rules)
+    return rule_ids[selected_indices[0]] if selected_indices and selected_indices[0] < len(rule_ids) else None
+
+def toggle_selected_rule():
+    rule = alert_engine.rules.get(get_selected_rule_id())
+    if not rule: return
+    alert_engine.set_enabled(rule.rule_id, not rule.enabled)
+    alert_engine.save()
+    populate_rules_view()
+
+def delete_selected_rule():
+    rule_id = get_selected_rule_id()
+    if not rule_id: return
+    alert_engine.remove_rule(rule_id)
+    alert_engine.save()
+    populate_rules_view()
+
+def populate_rules_view():
+    if 'rules_listbox' not in globals() or not rules_listbox.winfo_exists(): return
+    selected_rule_id = get_selected_rule_id()
+    rules_listbox.delete(0, tk.END)
+    for rule in alert_engine.rules.values():
+        rules_listbox.insert(tk.END, f"{'✅' if rule.enabled else '⏸'} {rule.describe()} (fired {rule.fire_count}x)")
+        if rule.rule_id == selected_rule_id: rules_listbox.selection_set(tk.END)
+    recent_alerts_text.config(state=tk.NORMAL)
+    recent_alerts_text.delete('1.0', tk.END)
+    lines = [f"{time.strftime('%H:%M:%S', time.localtime(a['firedAt']))}  {a['message']}" for a in reversed(alert_engine.recent)]
+    recent_alerts_text.insert('1.0', "\n".join(lines) if lines else "No alerts fired yet.")
+    recent_alerts_text.config(state=tk.DISABLED)
+
+
+# --- Recipient Planner ---
+def open_recipient_planner():
+    if not client_is_ready():
+        messagebox.showerror("Recipient Planner", "WhatsApp client is not ready. Cannot fetch group participants.")
+        return
+    candidate_ids = get_selected_chat_ids() or list(chat_mapping.values()) # Whole chat list if nothing selected
+    if not candidate_ids:
+        messagebox.showinfo("Recipient Planner", "No chats loaded yet. Please refresh chats first.")
+        return
+    coverage_pct = simpledialog.askfloat("Recipient Planner",
+                                         f"Planning for {len(candidate_ids)} chat(s).\n"
+                                         "Target coverage of their combined audience (%):",
+                                         initialvalue=100.0, minvalue=1.0, maxvalue=100.0, parent=root)
+    if coverage_pct is None: return
+    update_status_label("Fetching group participants for recipient planning...", "blue")
+    threading.Thread(target=_plan_recipients_threaded, args=(candidate_ids, coverage_pct / 100.0), daemon=True).start()
+
+def _plan_recipients_threaded(candidate_ids, coverage):
+    global audience_index
+    try:
+        response = http_get(NODE_API_GET_CHATS, params={'participants': '1'}, timeout=30) # Member lists can be large
+        response.raise_for_status()
+        data = response.json()
+        if not data.get('success'):
+            root.after(0, update_status_label, f"Failed to fetch participants: {data.get('message', 'No message')}", "red")
+            return
+        audience_index = recipient_planner.AudienceIndex.from_chats(data.get('chats') or [])
+        plan = recipient_planner.plan_recipients(audience_index, candidate_ids, coverage)
+        root.after(0, show_recipient_plan, plan, coverage)
+    except requests.exceptions.RequestException as e:
+        root.after(0, update_status_label, f"Error fetching participants (HTTP): {e}", "red")
+        log.warning("Recipient planner fetch error: %s", e)
+    except Exception as e:
+        root.after(0, update_status_label, f"Unexpected error while planning recipients: {e}", "red")
+        log.exception("Unexpected recipient planner error: %s", e)
+
+def show_recipient_plan(plan, coverage):
+    update_status_label(f"Recipient plan ready: {len(plan['send_ids'])} send(s), {plan['sends_saved']} saved.", "green")
+    plan_window = tk.Toplevel(root)
+    plan_window.title("Recipient Planner")
+    plan_window.geometry("620x520")
+
+    plan_text = scrolledtext.ScrolledText(plan_window, wrap=tk.WORD, font=(base_font_family, 9), relief=tk.SOLID, borderwidth=1)
+    plan_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=(10,5))
+    plan_text.insert('1.0', recipient_planner.format_plan(plan, coverage))
+    plan_text.config(state=tk.DISABLED)
+
+    def select_planned_chats():
+        planned = set(plan['send_ids'])
+        poll_chat_listbox.selection_clear(0, tk.END)
+        for i, display_name in enumerate(poll_chat_listbox.get(0, tk.END)):
+            if chat_mapping.get(display_name) in planned:
+                poll_chat_listbox.selection_set(i)
+        update_status_label(f"Selected {len(planned)} planned chat(s).", "blue")
+
+    def send_to_planned_chats():
+        plan_window.destroy()
+        send_poll_message(chat_ids=plan['send_ids'])
+
+    plan_button_frame = ttk.Frame(plan_window)
+    plan_button_frame.pack(pady=(5,10))
+    ttk.Button(plan_button_frame, text="✔ Select Planned Chats", command=select_planned_chats, style="Small.TButton").pack(side=tk.LEFT, padx=5)
+    ttk.Button(plan_button_frame, text="🚀 Send Poll to Planned Chats", command=send_to_planned_chats, style="Bold.TButton").pack(side=tk.LEFT, padx=5)
+    ttk.Button(plan_button_frame, text="Close", command=plan_window.destroy, style="Small.TButton").pack(side=tk.LEFT, padx=5)
+
+
 def add_poll_option():
     option = poll_option_entry.get().strip()
     if option:
@@ -486,33 +1004,158 @@ def delete_selected_poll_template():
             messagebox.showerror("Delete Template", "Selected template not found (it may have been already deleted).")
 
 # --- Poll Results Functions ---
-def fetch_all_poll_data_from_server():
-    global active_polls_data_from_server
-    # No need to check sio_connected here, as HTTP GET might work even if socket is temp down
-    update_status_label("Fetching all poll data via HTTP...", "blue")
+def fetch_all_poll_data_from_server(full=False):
+    # Pages through /get-all-poll-data on a worker thread (JSON parsed there, voter maps left out)
+    # and merges every page on the Tk thread as it arrives. Only polls changed since the last
+    # sync are requested, unless `full` is set or the backend restarted in the meantime.
+    global poll_sync_running, poll_sync_queued, worker_poll_sync
+    if poll_sync_running: # Run once more afterwards instead of paging twice in parallel
+        poll_sync_queued = bool(full or poll_sync_queued)
+        return
+    poll_sync_running = True
+    update_status_label("Fetching poll data via HTTP...", "blue")
+    if engine: # Pages come back as 'poll_page' messages, then 'sync_done'
+        worker_poll_sync = new_poll_sync_state(full)
+        engine.send_command('sync_polls', full, poll_sync_cursor, poll_sync_epoch, POLL_SYNC_PAGE_SIZE)
+        return
+    threading.Thread(target=_sync_polls_threaded, args=(full, poll_sync_cursor, poll_sync_epoch), daemon=True).start()
+
+def new_poll_sync_state(full):
+    return {'full': full, 'seen': set(), 'polls': 0, 'started': time.time()}
+
+def _sync_polls_threaded(full, since, epoch):
+    sync = new_poll_sync_state(full)
+    cursor = 0 if full else since
+    pages = 0
     try:
-        response = requests.get(NODE_API_GET_ALL_POLL_DATA, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        if data.get('success'):
-            active_polls_data_from_server = data.get('polls', {}) # Expects a dict
-            if not isinstance(active_polls_data_from_server, dict): # Basic type check
-                print("Warning: Poll data from server is not a dictionary. Resetting.")
-                active_polls_data_from_server = {}
-            populate_poll_results_listbox()
-            update_status_label(f"Fetched/Refreshed {len(active_polls_data_from_server)} polls.", "green")
-        else:
-            update_status_label(f"Failed to fetch poll data: {data.get('message', 'No error message')}", "red")
+        while True:
+            response = http_get(NODE_API_GET_ALL_POLL_DATA, params={'limit': POLL_SYNC_PAGE_SIZE, 'since': cursor, 'voters': '0'}, timeout=10)
+            response.raise_for_status()
+            data = response.json()
+            legacy = 'latestRev' not in data # Backend without paging: this is already the complete poll dict
+            if legacy:
+                sync['full'] = True
+            elif pages == 0 and not sync['full'] and (data.get('serverEpoch') != epoch or data.get('latestRev', 0) < cursor):
+                log.info("Backend restarted since the last poll sync; fetching all polls")
+                sync['full'] = True
+                cursor = 0
+                continue
+            pages += 1
+            root.after(0, apply_poll_page, data, sync)
+            if legacy or not data.get('success') or data.get('nextCursor') is None:
+                break
+            cursor = data['nextCursor']
+    except backend_health.BackendUnavailable:
+        node_health.defer('poll_sync', functools.partial(fetch_all_poll_data_from_server, sync['full']))
+        root.after(0, update_status_label, "Node server unreachable; poll data will be fetched when it is back.", "orange")
     except requests.exceptions.RequestException as e:
-        update_status_label(f"Error fetching poll data (HTTP): {e}", "red")
-        print(f"Error fetching poll data: {e}")
+        root.after(0, update_status_label, f"Error fetching poll data (HTTP): {e}", "red")
+        log.warning("Error fetching poll data: %s", e)
     except json.JSONDecodeError as je:
-        update_status_label(f"Error decoding poll data JSON: {je}", "red")
-        print(f"JSON Decode Error for poll data: {je}")
+        root.after(0, update_status_label, f"Error decoding poll data JSON: {je}", "red")
+        log.error("JSON decode error for poll data: %s", je)
+    finally:
+        root.after(0, _poll_sync_finished)
+
+def _poll_sync_finished():
+    global poll_sync_running, poll_sync_queued
+    poll_sync_running = False
+    if poll_sync_queued is not None:
+        full, poll_sync_queued = poll_sync_queued, None
+        fetch_all_poll_data_from_server(full)
+
+def merge_poll_from_server(poll_msg_id, poll):
+    current = active_polls_data_from_server.get(poll_msg_id)
+    if 'voters' in poll: # Full poll (older backend, or GET /poll/<id>)
+        active_polls_data_from_server[poll_msg_id] = poll
+        return
+    if current is not None and current.get('rev', -1) >= poll.get('rev', 0):
+        return # What we hold is at least as new (e.g. kept current by poll_update_to_gui)
+    summary = dict(poll)
+    summary['votersPending'] = True # Voter map is fetched when the poll is opened
+    active_polls_data_from_server[poll_msg_id] = summary
+
+
+@timed_handler("http:/get-all-poll-data")
+def apply_poll_page(data, sync=None):
+    # One page of /get-all-poll-data, on the Tk thread. `sync` is the paging state of a live sync
+    # (None for a replayed response); the last page (no nextCursor) finishes the sync.
+    global poll_sync_cursor, poll_sync_epoch
+    if not data.get('success'):
+        update_status_label(f"Failed to fetch poll data: {data.get('message', 'No error message')}", "red")
+        return
+    polls = data.get('polls', {}) # Expects a dict
+    if not isinstance(polls, dict): # Basic type check
+        log.warning("Poll data from server is not a dictionary. Ignoring page.")
+        polls = {}
+    for poll_msg_id, poll in polls.items():
+        merge_poll_from_server(poll_msg_id, poll)
+        campaign_store.apply_poll(poll_msg_id, active_polls_data_from_server[poll_msg_id])
+    schedule_campaign_view_refresh()
+    if sync is not None:
+        sync['seen'].update(polls)
+        sync['polls'] += len(polls)
+    schedule_poll_list_refresh()
+    if data.get('nextCursor') is not None:
+        update_status_label(f"Loading polls... {sync['polls'] if sync else len(polls)} received so far", "blue")
+        return
+
+    if sync is not None and sync['full']: # Polls the backend no longer has, unless they arrived during the sync
+        stale = [pid for pid in active_polls_data_from_server
+                 if pid not in sync['seen'] and poll_retention.last_activity.get(pid, 0) < sync['started']]
+        for pid in stale:
+            del active_polls_data_from_server[pid]
+    if 'latestRev' in data:
+        poll_sync_cursor = data['latestRev']
+        poll_sync_epoch = data.get('serverEpoch')
+    enforce_poll_retention(repopulate=False)
+    publish_poll_event('polls_reset', {'pollCount': len(active_polls_data_from_server)})
+    update_status_label(f"Fetched/Refreshed {len(active_polls_data_from_server)} polls.", "green")
+
+
+def schedule_poll_list_refresh():
+    # Coalesces listbox rebuilds: pages and new polls arriving close together cost one repopulate
+    global poll_list_refresh_pending
+    if poll_list_refresh_pending or 'root' not in globals(): return
+    poll_list_refresh_pending = True
+    root.after(100, _run_poll_list_refresh)
+
+def _run_poll_list_refresh():
+    global poll_list_refresh_pending
+    poll_list_refresh_pending = False
+    populate_poll_results_listbox()
+
+
+def request_poll_voters(poll_msg_id):
+    if poll_msg_id in poll_voter_fetches: return
+    poll_voter_fetches.add(poll_msg_id)
+    if engine:
+        engine.send_command('get_poll', poll_msg_id) # The worker holds voter maps; answered with 'poll_voters'
+        return
+    threading.Thread(target=_fetch_poll_voters_threaded, args=(poll_msg_id,), daemon=True).start()
+
+def _fetch_poll_voters_threaded(poll_msg_id):
+    try:
+        response = http_get(f"{NODE_API_GET_POLL}/{quote(poll_msg_id, safe='')}", timeout=10)
+        response.raise_for_status()
+        data = response.json()
+        root.after(0, apply_poll_voters, poll_msg_id, data.get('poll') if data.get('success') else None)
+    except (requests.exceptions.RequestException, json.JSONDecodeError) as e:
+        log.warning("Could not fetch voters for poll %s: %s", poll_msg_id, e)
+        root.after(0, apply_poll_voters, poll_msg_id, None)
+
+def apply_poll_voters(poll_msg_id, poll):
+    poll_voter_fetches.discard(poll_msg_id)
+    current = active_polls_data_from_server.get(poll_msg_id)
+    if not poll or not current or not current.get('votersPending'): return # Gone, or a live update already filled it in
+    active_polls_data_from_server[poll_msg_id] = poll
+    if get_selected_poll_id() == poll_msg_id:
+        display_selected_poll_results()
 
 
 def populate_poll_results_listbox():
     if 'poll_results_listbox' not in globals() or not poll_results_listbox.winfo_exists(): return
+    selected_poll_id = get_selected_poll_id() # Keep the selection across refreshes
     poll_results_listbox.delete(0, tk.END) # Clear existing items
 
     if not active_polls_data_from_server:
@@ -530,8 +1173,38 @@ def populate_poll_results_listbox():
     for poll_msg_id, poll_info in sorted_poll_items:
         question = poll_info.get('question', 'Unnamed Poll')
         # Use last 6 chars of ID for display, more readable
-        display_text = f"{question[:50]}{'...' if len(question) > 50 else ''} (ID: ...{poll_msg_id[-6:]})"
+        display_text = f"{'🗄 ' if poll_info.get('archived') else ''}{question[:50]}{'...' if len(question) > 50 else ''} (ID: ...{poll_msg_id[-6:]})"
         poll_results_listbox.insert(tk.END, display_text)
+        if poll_msg_id == selected_poll_id: poll_results_listbox.selection_set(tk.END)
+
+def poll_id_from_display_text(display_text):
+    # Listbox rows end with "(ID: ...<last 6 chars of the poll ID>)"
+    if "(ID: ..." not in display_text or not display_text.endswith(")"): return None
+    id_suffix = display_text.split('(ID: ...')[-1][:-1] # Remove trailing ')'
+    for pid_key in list(active_polls_data_from_server.keys()):
+        if pid_key.endswith(id_suffix):
+            return pid_key
+    return None
+
+def get_selected_poll_id():
+    if 'poll_results_listbox' not in globals() or not poll_results_listbox.winfo_exists(): return None
+    selected_indices = poll_results_listbox.curselection()
+    return poll_id_from_display_text(poll_results_listbox.get(selected_indices[0])) if selected_indices else None
+
+def enforce_poll_retention(repopulate=True):
+    selected_poll_id = get_selected_poll_id() # Never archive the poll being viewed
+    archived = poll_retention.enforce(active_polls_data_from_server, pinned={selected_poll_id} if selected_poll_id else ())
+    if archived:
+        log.info("Archived %d cold poll(s) to '%s'", len(archived), POLL_ARCHIVE_DIR)
+        if engine: engine.send_command('release_voters', archived) # The worker drops its voter maps too
+        if repopulate: populate_poll_results_listbox()
+
+def periodic_poll_retention():
+    try:
+        enforce_poll_retention()
+    except Exception as e:
+        log.exception("Poll retention check failed: %s", e)
+    root.after(POLL_RETENTION_CHECK_INTERVAL_MS, periodic_poll_retention)
 
 
 def display_selected_poll_results(event=None): # Bound to listbox selection
@@ -553,22 +1226,19 @@ def display_selected_poll_results(event=None): # Bound to listbox selection
 
     # Robustly find the poll_msg_id based on the display text suffix
     try:
-        if "(ID: ..." in selected_item_display_text and selected_item_display_text.endswith(")"):
-            id_suffix_with_ellipsis = selected_item_display_text.split('(ID: ...')[-1]
-            id_suffix = id_suffix_with_ellipsis[:-1] # Remove trailing ')'
-            for pid_key in active_polls_data_from_server.keys():
-                if pid_key.endswith(id_suffix):
-                    actual_poll_msg_id = pid_key
-                    break
+        actual_poll_msg_id = poll_id_from_display_text(selected_item_display_text)
         if not actual_poll_msg_id:
             raise ValueError("Could not match listbox item to a poll ID.")
     except Exception as e:
-        print(f"Error parsing poll ID from listbox item '{selected_item_display_text}': {e}")
+        log.warning("Error parsing poll ID from listbox item %r: %s", selected_item_display_text, e)
         poll_results_label.insert('1.0', f"Error finding poll data for: {selected_item_display_text}")
         poll_results_label.config(state=tk.DISABLED)
         return
 
     poll_info = active_polls_data_from_server.get(actual_poll_msg_id)
+    if poll_info and poll_info.get('archived'): # Lazy reload of the full poll (voter map) from disk
+        poll_info = poll_retention.reload(active_polls_data_from_server, actual_poll_msg_id)
+    poll_retention.touch(actual_poll_msg_id)
     if not poll_info:
         poll_results_label.insert('1.0', f"Poll data not found for ID: {actual_poll_msg_id}")
         poll_results_label.config(state=tk.DISABLED)
@@ -597,7 +1267,11 @@ def display_selected_poll_results(event=None): # Bound to listbox selection
     results_str += "------------------------------------\n"
     voters_data = poll_info.get('voters', {}) # Keyed by voterJid, value is array of selected hashes
     unique_voter_jids = list(voters_data.keys())
-    results_str += f"Total Unique Voters Participated: {len(unique_voter_jids)}\n"
+    voter_count = len(unique_voter_jids) if 'voters' in poll_info else poll_info.get('voterCount', 0) # Summary rows only carry a count
+    results_str += f"Total Unique Voters Participated: {voter_count}\n"
+    if poll_info.get('votersPending'): # Paged sync leaves voter maps out; fetch this one now
+        request_poll_voters(actual_poll_msg_id)
+        results_str += "(Loading voter details...)\n"
     # total_individual_selections = sum(len(v_hashes) for v_hashes in voters_data.values()) # Sum of all selected hashes by all voters
     # results_str += f"Total Individual Option Selections Made: {total_individual_selections}\n"
     results_str += f"(Note: Total votes on options ({total_votes_on_options}) might differ from unique voters if multiple selections are allowed or votes changed.)\n"
@@ -634,7 +1308,7 @@ def _logout_threaded():
     # GUI update එක main thread එකෙන් කරන්න root.after භාවිතා කරනවා
 
     try:
-        response = requests.post(NODE_API_LOGOUT, timeout=15) # Slightly longer timeout for logout
+        response = http_post(NODE_API_LOGOUT, timeout=15) # Slightly longer timeout for logout
         response.raise_for_status()
         result = response.json()
         if result.get('success'):
@@ -650,12 +1324,312 @@ def _logout_threaded():
         err_msg = f"Logout request error: {e}"
         root.after(0, update_status_label, err_msg, "red")
         root.after(0, messagebox.showerror, "Logout Error", err_msg, parent=root)
-        print(err_msg)
+        log.warning("Logout failed: %s", err_msg)
     except Exception as e: # Catch any other unexpected error
         err_msg = f"Unexpected error during logout: {e}"
         root.after(0, update_status_label, err_msg, "red")
         root.after(0, messagebox.showerror, "Logout Error", err_msg, parent=root)
-        print(err_msg)
+        log.warning("Logout failed: %s", err_msg)
+
+
+# --- Engine Worker Process ---
+def start_engine_worker():
+    global engine
+    engine = engine_worker.EngineWorker(NODE_SERVER_URL, WORKER_FLUSH_INTERVAL_S, app_logging.get_level_name())
+    engine.start()
+    if event_log: engine.send_command('record_http', True) # --record starts the capture before the worker
+    root.after(WORKER_POLL_INTERVAL_MS, drain_engine_worker)
+
+def drain_engine_worker():
+    if not engine: return
+    deadline = time.perf_counter() + WORKER_DRAIN_BUDGET_S
+    while time.perf_counter() < deadline:
+        try:
+            message = engine.messages.get_nowait()
+        except queue.Empty:
+            break
+        try:
+            dispatch_worker_message(message)
+        except Exception as e:
+            log.exception("Error handling engine worker message %r: %s", message[0], e)
+    root.after(WORKER_POLL_INTERVAL_MS, drain_engine_worker)
+
+def dispatch_worker_message(message):
+    global worker_stats
+    kind = message[0]
+    handlers = sio.handlers.get('/', {}) # Same (instrumented) handlers a live socket in this process would call
+    if kind == 'sio':
+        handler = handlers.get(message[1])
+        if handler: handler(*message[2])
+    elif kind == 'poll_updates':
+        for update in message[1]:
+            handlers['poll_update_to_gui'](update)
+    elif kind == 'poll_page':
+        if worker_poll_sync is not None: worker_poll_sync['full'] = message[2] # The worker may have switched to a full sync
+        apply_poll_page(message[1], worker_poll_sync)
+    elif kind == 'sync_done':
+        _poll_sync_finished()
+    elif kind == 'poll_voters':
+        apply_poll_voters(message[1], message[2])
+    elif kind == 'chats':
+        apply_chats_data(message[1])
+    elif kind == 'status_data':
+        apply_status_data(message[1])
+    elif kind == 'worker_stats':
+        worker_stats = message[1]
+    elif kind == 'http_log':
+        if event_log: event_log.record_http(*message[1:])
+    elif kind == 'status':
+        update_status_label(message[1], message[2])
+    elif kind == 'send_result':
+        _, job_id, chat_id, poll_msg_id = message
+        campaign = worker_send_jobs.get(job_id)
+        if campaign and poll_msg_id:
+            add_poll_to_campaign(campaign.campaign_id, poll_msg_id, chat_id,
+                                 next((name for name, cid in chat_mapping.items() if cid == chat_id), None))
+    elif kind == 'send_done':
+        _, job_id, success_count, fail_count = message
+        campaign = worker_send_jobs.pop(job_id, None)
+        if campaign: finish_campaign_send(campaign.campaign_id)
+        update_status_label(f"Poll sending finished. Success: {success_count}, Failed: {fail_count}.", "blue" if fail_count == 0 else "orange")
+    elif kind == 'worker_exit':
+        log.error("Engine worker process exited (code %s)", message[1])
+        update_status_label("Engine worker process stopped. Restart the application.", "red")
+
+def start_worker_send(chat_ids, question, options, allow_multiple):
+    job_id = f"send-{time.time():.6f}"
+    worker_send_jobs[job_id] = campaign_store.create(question, options) if len(chat_ids) > 1 else None
+    engine.send_command('send', job_id, list(chat_ids), question, options, allow_multiple,
+                        anti_ban_delay_min.get(), anti_ban_delay_max.get())
+
+
+# --- Event Capture / Replay ---
+HTTP_REPLAY_HANDLERS = { # Recorded HTTP responses that are fed back through their processing function
+    "/status": apply_status_data,
+    "/get-chats": apply_chats_data,
+    "/get-all-poll-data": apply_poll_page,
+}
+
+def start_event_capture(path):
+    global event_log
+    if event_log: stop_event_capture()
+    try:
+        event_log = event_recorder.EventRecorder(path)
+    except OSError as e:
+        update_status_label(f"Cannot start capture: {e}", "red")
+        return
+    if engine: engine.send_command('record_http', True) # The worker makes the HTTP calls and reports their responses
+    update_status_label(f"Capturing backend events to {path}", "magenta")
+    log.info("Event capture started: %s", path)
+
+def stop_event_capture():
+    global event_log
+    if not event_log: return
+    recorder, event_log = event_log, None
+    if engine: engine.send_command('record_http', False)
+    recorder.close()
+    update_status_label(f"Capture stopped ({recorder.records_written} events written to {recorder.path}).", "blue")
+    log.info("Event capture stopped: %d events -> %s", recorder.records_written, recorder.path)
+
+def dispatch_replayed_event(record):
+    if record['k'] == 'sio':
+        handler = sio.handlers.get('/', {}).get(record['e']) # Same (instrumented) handlers a live socket would call
+        if handler: handler(*record.get('a', []))
+    elif record['k'] == 'http':
+        handler = HTTP_REPLAY_HANDLERS.get(record['e'])
+        if handler and record.get('s') == 200:
+            handler(json.loads(record.get('b') or '{}'))
+
+def start_replay(path, speed=1.0):
+    global active_replayer
+    if active_replayer:
+        active_replayer.stop()
+    event_timings.reset() # Report covers this replay only
+    active_replayer = event_recorder.EventReplayer(path, dispatch_replayed_event, speed, on_finished=_replay_finished)
+    active_replayer.start()
+    update_status_label(f"Replaying {os.path.basename(path)} at {'max' if not speed else f'{speed:g}x'} speed...", "magenta")
+
+def _replay_finished(events_replayed, elapsed, max_lag, error):
+    global active_replayer
+    active_replayer = None
+    summary = f"Replay finished: {events_replayed} events in {elapsed:.2f}s, worst lag behind schedule {max_lag * 1000:.0f} ms."
+    if error: summary += f" Stopped early: {error}"
+    log.info("%s\n%s", summary, event_timings.format_report())
+    root.after(0, update_status_label, summary, "orange" if error else "green")
+    root.after(0, refresh_diagnostics)
+
+def toggle_event_capture():
+    if event_log:
+        stop_event_capture()
+    else:
+        path = filedialog.asksaveasfilename(title="Capture backend events to...", defaultextension=".jsonl",
+                                            filetypes=[("Event log", "*.jsonl"), ("Gzipped event log", "*.jsonl.gz")], parent=root)
+        if path: start_event_capture(path)
+    refresh_diagnostics()
+    update_tools_menu()
+
+def choose_and_replay_capture():
+    path = filedialog.askopenfilename(title="Replay event capture", filetypes=[("Event log", "*.jsonl *.jsonl.gz"), ("All files", "*.*")], parent=root)
+    if not path: return
+    speed = simpledialog.askfloat("Replay Speed", "Replay speed multiplier (1 = real time, 0 = as fast as possible):",
+                                  initialvalue=1.0, minvalue=0.0, parent=root)
+    if speed is None: return
+    start_replay(path, speed)
+
+# --- Profiling & Stall Watchdog ---
+def start_profiling(path=None):
+    global sampling_profiler, profile_output_path
+    if sampling_profiler: return
+    profile_output_path = path or f"profile-{time.strftime('%Y%m%d-%H%M%S')}.folded"
+    sampling_profiler = profiler.SamplingProfiler(PROFILE_SAMPLE_INTERVAL_S)
+    sampling_profiler.start()
+    update_status_label(f"Profiling... (stop from Tools menu, output: {profile_output_path})", "magenta")
+    log.info("Sampling profiler started, output: %s", profile_output_path)
+
+def stop_profiling():
+    global sampling_profiler
+    if not sampling_profiler: return
+    active_profiler, sampling_profiler = sampling_profiler, None
+    samples = active_profiler.samples
+    try:
+        distinct = active_profiler.stop(profile_output_path)
+    except OSError as e:
+        update_status_label(f"Could not write profile: {e}", "red")
+        return
+    summary = f"Profile written to {profile_output_path} ({samples} samples, {distinct} distinct stacks)."
+    update_status_label(summary, "blue")
+    log.info("%s Render with flamegraph.pl or open in speedscope.app.", summary)
+
+def toggle_profiling():
+    if sampling_profiler:
+        stop_profiling()
+    else:
+        path = filedialog.asksaveasfilename(title="Write profile (folded stacks) to...", defaultextension=".folded",
+                                            initialfile=f"profile-{time.strftime('%Y%m%d-%H%M%S')}.folded",
+                                            filetypes=[("Folded stacks", "*.folded"), ("All files", "*.*")], parent=root)
+        if path: start_profiling(path)
+    update_tools_menu()
+
+def on_main_thread_stall(stalled_for, stack_text):
+    # Called from the watchdog thread while Tk is blocked, so only log here
+    log.warning("Tk main thread stalled for >%.0f ms. Main thread stack:\n%s", stalled_for * 1000, stack_text)
+
+def on_main_thread_recovered(stall_duration):
+    log.info("Tk main thread recovered after ~%.0f ms stall", stall_duration * 1000)
+
+def start_stall_watchdog(threshold_ms=STALL_THRESHOLD_MS):
+    global stall_watchdog
+    if threshold_ms <= 0: return
+    if stall_watchdog: stall_watchdog.stop()
+    stall_watchdog = profiler.StallWatchdog(root, threshold_ms, on_stall=on_main_thread_stall, on_recovered=on_main_thread_recovered)
+    stall_watchdog.start()
+
+def toggle_stall_watchdog():
+    if stall_watchdog and stall_watchdog.running:
+        stall_watchdog.stop()
+        update_status_label("Stall watchdog off.", "blue")
+    else:
+        start_stall_watchdog(int(stall_watchdog.threshold * 1000) if stall_watchdog else (STALL_THRESHOLD_MS or 500))
+        update_status_label("Stall watchdog on.", "blue")
+    update_tools_menu()
+
+def update_tools_menu():
+    if 'tools_menu' not in globals(): return
+    tools_menu.entryconfig(0, label="⏹ Stop Profiling" if sampling_profiler else "🔥 Start Profiling...")
+    watchdog_enabled_var.set(bool(stall_watchdog and stall_watchdog.running))
+    tools_menu.entryconfig(3, label="⏹ Stop Event Capture" if event_log else "⏺ Start Event Capture...")
+    results_api_enabled_var.set(results_api is not None)
+
+# --- Local Results API ---
+def publish_poll_event(event, data):
+    # Fan-out point for dashboards; compact summaries only, never voter maps
+    if results_api: results_api.publish(event, data)
+
+def start_results_api(port=LOCAL_API_DEFAULT_PORT):
+    global results_api
+    if results_api: return
+    api = local_api.LocalResultsAPI(lambda: active_polls_data_from_server, LOCAL_API_HOST, port, LOCAL_API_ALLOWED_ORIGINS)
+    try:
+        api.start()
+    except OSError as e:
+        update_status_label(f"Could not start local results API on port {port}: {e}", "red")
+        log.error("Could not start local results API on port %s: %s", port, e)
+        return
+    results_api = api
+    update_status_label(f"Local results API serving at {api.url} (/polls, /events)", "green")
+
+def stop_results_api():
+    global results_api
+    if not results_api: return
+    api, results_api = results_api, None
+    api.stop()
+    update_status_label("Local results API stopped.", "blue")
+
+def toggle_results_api():
+    if results_api: stop_results_api()
+    else: start_results_api()
+    update_tools_menu()
+
+# --- Log Levels ---
+def set_client_log_level(level_name):
+    app_logging.set_level(level_name)
+    log_level_var.set(level_name)
+    log.info("Client log level set to %s", level_name)
+    update_status_label(f"Client log level: {level_name}", "blue")
+
+def set_server_log_level():
+    level_name = simpledialog.askstring("Server Log Level", "Node server log level (trace, debug, info, warn, error, fatal, silent):",
+                                        initialvalue="info", parent=root)
+    if not level_name: return
+    threading.Thread(target=_set_server_log_level_threaded, args=(level_name.strip().lower(),), daemon=True).start()
+
+def _set_server_log_level_threaded(level_name):
+    try:
+        response = http_post(NODE_API_LOG_LEVEL, json={"level": level_name}, timeout=5)
+        result = response.json()
+        if response.ok and result.get('success'):
+            root.after(0, update_status_label, f"Server log level: {result.get('level', level_name)}", "blue")
+        else:
+            root.after(0, update_status_label, f"Server rejected log level: {result.get('message', response.status_code)}", "red")
+    except (requests.exceptions.RequestException, ValueError) as e:
+        root.after(0, update_status_label, f"Could not set server log level: {e}", "red")
+        log.warning("Could not set server log level: %s", e)
+
+# --- Diagnostics ---
+def refresh_diagnostics():
+    if 'diagnostics_text' not in globals() or not diagnostics_text.winfo_exists(): return
+    lines = [
+        "Memory:",
+        poll_retention.format_stats(active_polls_data_from_server),
+        "------------------------------------",
+        f"Event capture: {'ON -> ' + event_log.path if event_log else 'off'}",
+        f"Replay: {'running (' + str(active_replayer.events_replayed) + ' events so far)' if active_replayer else 'idle'}",
+        "------------------------------------",
+        "Event processing times:",
+        event_timings.format_report(),
+        "------------------------------------",
+        f"Profiler: {'sampling (' + str(sampling_profiler.samples) + ' samples) -> ' + profile_output_path if sampling_profiler else 'off'}",
+        stall_watchdog.format_stats() if stall_watchdog else "Stall watchdog: off",
+        "------------------------------------",
+        node_health.format_stats() if node_health.running else "Node backend health probe: off",
+        alert_engine.format_stats(),
+        f"Engine worker process: {f'pid {engine.pid}, ' + ('running' if engine.running else 'EXITED') + f', {engine.messages_received} messages received' if engine else 'off (network runs in this process)'}",
+        *([f"Engine worker poll store: {worker_stats['polls']} poll(s), {worker_stats['voterMaps']} voter map(s) "
+           f"({worker_stats['voters']} voters)" + (f", peak RSS {worker_stats['peakRss'] / 1024 / 1024:.1f} MiB" if worker_stats['peakRss'] else "")]
+          if engine and worker_stats else []),
+        "------------------------------------",
+        f"Local results API: {results_api.url + ' (' + str(results_api.subscriber_count()) + ' SSE subscriber(s), version ' + str(results_api.version) + ')' if results_api else 'off'}",
+    ]
+    diagnostics_text.config(state=tk.NORMAL)
+    diagnostics_text.delete('1.0', tk.END)
+    diagnostics_text.insert('1.0', "\n".join(lines))
+    diagnostics_text.config(state=tk.DISABLED)
+    if 'capture_button' in globals(): capture_button.config(text="⏹ Stop Capture" if event_log else "⏺ Start Capture...")
+    update_tools_menu()
+
+def reset_diagnostics():
+    event_timings.reset()
+    refresh_diagnostics()
 
 
 # --- GUI Setup ---
@@ -691,7 +1665,7 @@ style = ttk.Style()
 try:
     style.theme_use('clam')
 except tk.TclError:
-    print("Clam theme not available, using default.") # Fallback for environments where clam is not present
+    log.info("Clam theme not available, using default.") # Fallback for environments where clam is not present
 
 # Configure styles
 style.configure("TNotebook", tabposition='n') # Tabs on top
@@ -718,6 +1692,29 @@ style.configure("TCheckbutton", font=label_font)
 style.configure("MainTitle.TLabel", font=main_title_font)
 
 
+# Menu bar
+menu_bar = tk.Menu(root)
+tools_menu = tk.Menu(menu_bar, tearoff=0)
+watchdog_enabled_var = tk.BooleanVar(value=False)
+tools_menu.add_command(label="🔥 Start Profiling...", command=toggle_profiling) # index 0, label toggled in update_tools_menu
+tools_menu.add_checkbutton(label="Tk Stall Watchdog", variable=watchdog_enabled_var, command=toggle_stall_watchdog)
+tools_menu.add_separator()
+tools_menu.add_command(label="⏺ Start Event Capture...", command=toggle_event_capture) # index 3
+tools_menu.add_command(label="▶ Replay Capture...", command=choose_and_replay_capture)
+tools_menu.add_separator()
+log_level_var = tk.StringVar(value=app_logging.get_level_name())
+log_level_menu = tk.Menu(tools_menu, tearoff=0)
+for level_name in app_logging.LEVEL_NAMES:
+    log_level_menu.add_radiobutton(label=level_name, value=level_name, variable=log_level_var,
+                                   command=lambda name=level_name: set_client_log_level(name))
+tools_menu.add_cascade(label="Log Level", menu=log_level_menu)
+tools_menu.add_command(label="Server Log Level...", command=set_server_log_level)
+tools_menu.add_separator()
+results_api_enabled_var = tk.BooleanVar(value=False)
+tools_menu.add_checkbutton(label=f"Local Results API (read-only, port {LOCAL_API_DEFAULT_PORT})", variable=results_api_enabled_var, command=toggle_results_api)
+menu_bar.add_cascade(label="Tools", menu=tools_menu)
+root.config(menu=menu_bar)
+
 notebook = ttk.Notebook(main_frame) # Style will be applied via TNotebook configuration
 notebook.pack(fill=tk.BOTH, expand=True)
 
@@ -767,6 +1764,7 @@ poll_chat_listbox = tk.Listbox(poll_chat_listbox_frame, selectmode=tk.EXTENDED,
 poll_chat_listbox_scrollbar.config(command=poll_chat_listbox.yview)
 poll_chat_listbox_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 poll_chat_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+ttk.Button(poll_sender_tab, text="🧮 Plan Recipients (skip overlapping groups)", command=open_recipient_planner, style="Small.TButton").pack(padx=5, pady=(0,5), anchor=tk.W)
 
 # Poll Question
 ttk.Label(poll_sender_tab, text="Poll Question:", anchor=tk.W, font=label_font).pack(fill=tk.X, padx=5, pady=(15,2))
@@ -859,35 +1857,114 @@ poll_results_label = scrolledtext.ScrolledText(
 poll_results_label.pack(fill=tk.BOTH, expand=True, padx=2, pady=2)
 # Initial text set in display_selected_poll_results or populate_poll_results_listbox if none selected
 
+# == Campaigns Tab ==
+campaigns_tab = ttk.Frame(notebook, padding=10)
+notebook.add(campaigns_tab, text="📦 Campaigns")
+
+campaign_management_frame = ttk.Frame(campaigns_tab)
+campaign_management_frame.pack(fill=tk.X, pady=(5,10))
+ttk.Label(campaign_management_frame, text="Multi-Chat Sends (Newest First):", font=bold_font).pack(side=tk.LEFT, anchor=tk.W, padx=(0,10))
+ttk.Button(campaign_management_frame, text="🗑 Delete Campaign", command=delete_selected_campaign, style="Small.TButton").pack(side=tk.RIGHT, padx=5)
+
+campaign_listbox_frame = ttk.Frame(campaigns_tab)
+campaign_listbox_frame.pack(fill=tk.X, pady=10)
+campaign_scrollbar = ttk.Scrollbar(campaign_listbox_frame, orient=tk.VERTICAL)
+campaign_listbox = tk.Listbox(campaign_listbox_frame, yscrollcommand=campaign_scrollbar.set, exportselection=False, font=listbox_font, height=8)
+campaign_scrollbar.config(command=campaign_listbox.yview); campaign_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+campaign_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+campaign_listbox.bind("<<ListboxSelect>>", display_selected_campaign)
+
+campaign_results_frame = ttk.LabelFrame(campaigns_tab, text="Combined Results & Per-Chat Breakdown", padding=10)
+campaign_results_frame.pack(fill=tk.BOTH, expand=True, pady=(10,5))
+campaign_results_text = scrolledtext.ScrolledText(
+    campaign_results_frame, wrap=tk.WORD, font=(base_font_family, 9),
+    state=tk.DISABLED, relief=tk.SOLID, borderwidth=1, height=15
+)
+campaign_results_text.pack(fill=tk.BOTH, expand=True, padx=2, pady=2)
+
+# == Alert Rules Tab ==
+rules_tab = ttk.Frame(notebook, padding=10)
+notebook.add(rules_tab, text="🔔 Rules")
+
+rules_button_frame = ttk.Frame(rules_tab)
+rules_button_frame.pack(fill=tk.X, pady=(5,10))
+ttk.Button(rules_button_frame, text="➕ Rule for Selected Poll", command=add_rule_for_selected_poll, style="Small.TButton").pack(side=tk.LEFT, padx=5)
+ttk.Button(rules_button_frame, text="➕ Rule for Selected Campaign", command=add_rule_for_selected_campaign, style="Small.TButton").pack(side=tk.LEFT, padx=5)
+ttk.Button(rules_button_frame, text="🗑 Delete Rule", command=delete_selected_rule, style="Small.TButton").pack(side=tk.RIGHT, padx=5)
+ttk.Button(rules_button_frame, text="⏯ Enable/Disable", command=toggle_selected_rule, style="Small.TButton").pack(side=tk.RIGHT, padx=5)
+
+rules_listbox_frame = ttk.Frame(rules_tab)
+rules_listbox_frame.pack(fill=tk.X, pady=10)
+rules_scrollbar = ttk.Scrollbar(rules_listbox_frame, orient=tk.VERTICAL)
+rules_listbox = tk.Listbox(rules_listbox_frame, yscrollcommand=rules_scrollbar.set, exportselection=False, font=listbox_font, height=8)
+rules_scrollbar.config(command=rules_listbox.yview); rules_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+rules_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+recent_alerts_frame = ttk.LabelFrame(rules_tab, text="Recent Alerts", padding=10)
+recent_alerts_frame.pack(fill=tk.BOTH, expand=True, pady=(10,5))
+recent_alerts_text = scrolledtext.ScrolledText(
+    recent_alerts_frame, wrap=tk.WORD, font=(base_font_family, 9),
+    state=tk.DISABLED, relief=tk.SOLID, borderwidth=1, height=10
+)
+recent_alerts_text.pack(fill=tk.BOTH, expand=True, padx=2, pady=2)
+
+# == Diagnostics Tab ==
+diagnostics_tab = ttk.Frame(notebook, padding=10)
+notebook.add(diagnostics_tab, text="🩺 Diagnostics")
+
+diagnostics_button_frame = ttk.Frame(diagnostics_tab)
+diagnostics_button_frame.pack(fill=tk.X, pady=(5,10))
+ttk.Button(diagnostics_button_frame, text="🔄 Refresh", command=refresh_diagnostics, style="Refresh.TButton").pack(side=tk.LEFT, padx=5)
+ttk.Button(diagnostics_button_frame, text="♻ Reset Timings", command=reset_diagnostics, style="Small.TButton").pack(side=tk.LEFT, padx=5)
+capture_button = ttk.Button(diagnostics_button_frame, text="⏺ Start Capture...", command=toggle_event_capture, style="Small.TButton")
+capture_button.pack(side=tk.LEFT, padx=5)
+ttk.Button(diagnostics_button_frame, text="▶ Replay Capture...", command=choose_and_replay_capture, style="Small.TButton").pack(side=tk.LEFT, padx=5)
+
+diagnostics_text = scrolledtext.ScrolledText(
+    diagnostics_tab, wrap=tk.NONE, font=("Consolas", 9),
+    state=tk.DISABLED, relief=tk.SOLID, borderwidth=1
+)
+diagnostics_text.pack(fill=tk.BOTH, expand=True, padx=2, pady=2)
+notebook.bind("<<NotebookTabChanged>>", lambda e: refresh_diagnostics() if notebook.select() == str(diagnostics_tab) else None)
+
 # --- Socket.IO Connection Thread ---
 def attempt_sio_connection():
     """Attempt to connect to Socket.IO server in a loop."""
     if not sio.connected:
         try:
-            print("Attempting to connect to Socket.IO server...")
+            log.debug("Attempting to connect to Socket.IO server...")
             sio.connect(NODE_SERVER_URL, wait_timeout=5) # Shorter wait for individual attempt
         except socketio.exceptions.ConnectionError as e:
             # This error is expected if server is down, will be handled by sio's reconnection logic
-            print(f"Socket.IO connection attempt failed (will retry via client): {e}")
+            log.info("Socket.IO connection attempt failed (will retry via client): %s", e)
+            node_health.record_failure(e)
             if 'status_label' in globals() and status_label.winfo_exists():
                  root.after(0, update_status_label, "Socket.IO connection failed. Retrying...", "red")
         except Exception as e:
-            print(f"Unexpected error during Socket.IO connection attempt: {e}")
+            log.exception("Unexpected error during Socket.IO connection attempt: %s", e)
             if 'status_label' in globals() and status_label.winfo_exists():
                  root.after(0, update_status_label, f"Socket.IO error: {e}", "red")
 
 def sio_connection_thread_func():
     while True:
-        if not sio.connected:
+        # Only attempt while the shared health probe sees the backend; while it is down this waits
+        # for the probe instead of running its own connection attempts
+        if not sio.connected and node_health.wait_until_available(timeout=30):
             attempt_sio_connection()
         time.sleep(10) # Interval between connection attempts if not connected
 
 # --- Initializations & Main Loop ---
 def initial_gui_setup():
     update_poll_template_dropdown()
+    campaign_store.load()
+    populate_campaign_listbox()
+    alert_engine.load()
+    populate_rules_view()
+    root.after(POLL_RETENTION_CHECK_INTERVAL_MS, periodic_poll_retention)
+    if replay_mode: return # Everything comes from the recording
     # Initial fetch of poll data from server if it's already running
     # Do this slightly after GUI is up to ensure labels exist
-    root.after(1000, fetch_all_poll_data_from_server)
+    root.after(1000, fetch_all_poll_data_from_server, True) # Full sync; later refreshes only fetch changes
     # Initial check of WhatsApp status via HTTP as a fallback
     root.after(500, check_whatsapp_status)
 
@@ -895,16 +1972,55 @@ def initial_gui_setup():
 def on_closing():
     if messagebox.askokcancel("Quit", "Do you want to quit the Poll Master application?"):
         if sio.connected:
-            print("Disconnecting Socket.IO client...")
+            log.info("Disconnecting Socket.IO client...")
             sio.disconnect()
+        if active_replayer: active_replayer.stop()
+        stop_event_capture() # Flush and close the capture log
+        stop_profiling() # Write out the profile if one is running
+        if stall_watchdog: stall_watchdog.stop()
+        node_health.stop()
+        if engine: engine.stop()
+        alert_engine.stop()
+        stop_results_api()
         root.destroy()
-        print("Application closed.")
+        log.info("Application closed.")
+        app_logging.shutdown_logging() # Flush queued records
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="WhatsApp Poll Master GUI")
+    parser.add_argument("--record", metavar="FILE", help="capture every inbound Socket.IO event and HTTP response to FILE (.gz = gzip)")
+    parser.add_argument("--replay", metavar="FILE", help="replay a capture instead of connecting to the Node backend")
+    parser.add_argument("--replay-speed", type=float, default=1.0, help="replay speed multiplier, 0 = as fast as possible (default: 1)")
+    parser.add_argument("--profile", metavar="FILE", help="sample all threads from startup and write flamegraph-compatible folded stacks to FILE on exit")
+    parser.add_argument("--log-level", choices=app_logging.LEVEL_NAMES, type=str.upper, help=f"client log level (default: {LOG_LEVEL}, env POLLMASTER_LOG_LEVEL)")
+    parser.add_argument("--log-json", action="store_true", help="write log records as JSON lines")
+    parser.add_argument("--serve-api", metavar="PORT", type=int, nargs="?", const=LOCAL_API_DEFAULT_PORT,
+                        help=f"serve read-only poll results (JSON + SSE) on {LOCAL_API_HOST}:PORT (default port: {LOCAL_API_DEFAULT_PORT})")
+    parser.add_argument("--worker-process", action="store_true", help="run Socket.IO/HTTP, the poll store and sends in a separate process; the GUI gets coalesced updates")
+    parser.add_argument("--stall-ms", type=int, default=STALL_THRESHOLD_MS, help=f"log the Tk main thread stack when the event loop is blocked longer than this, 0 = off (default: {STALL_THRESHOLD_MS})")
+    cli_args = parser.parse_args()
+
+    if cli_args.log_json: app_logging.setup_logging(cli_args.log_level or LOG_LEVEL, json_lines=True)
+    if cli_args.log_level: set_client_log_level(cli_args.log_level)
     root.protocol("WM_DELETE_WINDOW", on_closing)
-    # Start the Socket.IO connection manager thread
-    sio_thread = threading.Thread(target=sio_connection_thread_func, daemon=True)
-    sio_thread.start()
+    if cli_args.profile: start_profiling(cli_args.profile)
+    start_stall_watchdog(cli_args.stall_ms)
+    if cli_args.serve_api is not None: start_results_api(cli_args.serve_api)
+    update_tools_menu()
+    if cli_args.replay:
+        replay_mode = True
+        root.after(500, start_replay, cli_args.replay, cli_args.replay_speed)
+    else:
+        if cli_args.record: start_event_capture(cli_args.record)
+        if cli_args.worker_process:
+            start_engine_worker() # Socket.IO and the poll store live in the worker process
+        else:
+            node_health.on_change = lambda available: root.after(0, on_backend_health_changed, available)
+            node_health.dispatch = lambda fn: root.after(0, fn) # Queued work resumes on the Tk thread
+            node_health.start()
+            # Start the Socket.IO connection manager thread
+            sio_thread = threading.Thread(target=sio_connection_thread_func, daemon=True)
+            sio_thread.start()
 
     # Schedule initial GUI setup tasks
     root.after(100, initial_gui_setup)
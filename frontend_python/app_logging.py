@@ -0,0 +1,170 @@
+# app_logging.py
+# Structured, leveled logging for the GUI that stays off the hot path.
+#
+# - Records are handed to a QueueHandler; formatting and console I/O happen on a
+#   QueueListener thread, so Socket.IO/Tk threads only pay for a queue put.
+# - RateLimitFilter caps how often the same message template can be emitted (with a
+#   "suppressed N" note once it is allowed again) and supports per-call sampling through
+#   `extra={'sample_rate': 0.01}`.
+# - summarize() wraps payloads (e.g. a poll update with a full voter map) in a lazy,
+#   size-capped summary that is only rendered if the record is actually emitted.
+# - Extra structured fields are passed as `extra={'fields': {...}}` and rendered as key=value.
+
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+import time
+
+LOG_FORMAT = "%(asctime)s %(levelname)-7s %(threadName)s %(name)s: %(message)s"
+LEVEL_NAMES = ("DEBUG", "INFO", "WARNING", "ERROR")
+
+_listener = None
+
+
+class PayloadSummary:
+    """Lazy, size-capped description of a payload; str() is only called for emitted records."""
+
+    def __init__(self, obj, max_chars=200):
+        self.obj = obj
+        self.max_chars = max_chars
+
+    def __str__(self):
+        text = self._describe(self.obj, depth=0)
+        return text if len(text) <= self.max_chars else text[:self.max_chars - 3] + "..."
+
+    def _describe(self, obj, depth):
+        if isinstance(obj, dict):
+            if depth >= 1:
+                return f"{{{len(obj)} keys}}"
+            parts = []
+            for key, value in list(obj.items())[:12]:
+                parts.append(f"{key}={self._describe(value, depth + 1)}")
+            if len(obj) > 12: parts.append(f"+{len(obj) - 12} more")
+            return "{" + ", ".join(parts) + "}"
+        if isinstance(obj, (list, tuple)):
+            return f"[{len(obj)} items]" if depth >= 1 or len(obj) > 5 else "[" + ", ".join(self._describe(v, depth + 1) for v in obj) + "]"
+        if isinstance(obj, str):
+            return repr(obj if len(obj) <= 60 else obj[:57] + "...")
+        return repr(obj)
+
+
+def summarize(obj, max_chars=200):
+    return PayloadSummary(obj, max_chars)
+
+
+class StructuredFormatter(logging.Formatter):
+    """Adds `fields` from extra={'fields': {...}} as key=value pairs (or a JSON object with json_lines)."""
+
+    def __init__(self, json_lines=False):
+        super().__init__(LOG_FORMAT)
+        self.json_lines = json_lines
+
+    def format(self, record):
+        fields = getattr(record, 'fields', None) or {}
+        if self.json_lines:
+            entry = {'ts': round(record.created, 3), 'level': record.levelname, 'logger': record.name,
+                     'thread': record.threadName, 'msg': record.getMessage()}
+            entry.update({k: str(v) if isinstance(v, PayloadSummary) else v for k, v in fields.items()})
+            if record.exc_info: entry['exc'] = self.formatException(record.exc_info)
+            return json.dumps(entry, ensure_ascii=False, default=str)
+        text = super().format(record)
+        if fields:
+            text += " | " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return text
+
+
+class RateLimitFilter(logging.Filter):
+    """Per message template: at most `burst` records per `period` seconds, plus optional sampling."""
+
+    def __init__(self, burst=20, period=10.0):
+        super().__init__()
+        self.burst = burst
+        self.period = period
+        self._lock = threading.Lock()
+        self._windows = {} # (logger, template) -> [window_start, emitted, suppressed]
+
+    def filter(self, record):
+        sample_rate = getattr(record, 'sample_rate', None)
+        if sample_rate is not None and sample_rate < 1.0 and random.random() >= sample_rate:
+            return False
+        if record.levelno >= logging.ERROR:
+            return True # Never drop errors
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.period:
+                suppressed = window[2] if window else 0
+                self._windows[key] = [now, 1, 0]
+                if suppressed:
+                    record.msg = f"{record.msg} (suppressed {suppressed} similar in last {self.period:g}s)"
+                if len(self._windows) > 5000: # Templates are finite, but never grow without bound
+                    self._windows = {k: w for k, w in self._windows.items() if now - w[0] < self.period}
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    # The stock prepare() formats the message on the calling thread; keep the record as-is so
+    # %-args and payload summaries are rendered on the listener thread instead.
+    def prepare(self, record):
+        return record
+
+
+def setup_logging(level="INFO", json_lines=False, burst=20, period=10.0):
+    """Route all logging through a queue to a background console writer. Safe to call once at startup."""
+    shutdown_logging() # Reconfiguring (e.g. --log-json) replaces the previous listener
+    global _listener
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+
+    console_handler = logging.StreamHandler(sys.stderr)
+    console_handler.setFormatter(StructuredFormatter(json_lines))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(burst, period)) # Filter before enqueueing, so dropped records cost nothing more
+    root_logger.addHandler(queue_handler)
+    try:
+        set_level(level)
+        unknown_level = None
+    except ValueError:
+        set_level(logging.INFO) # A typo in POLLMASTER_LOG_LEVEL must not stop the app from starting
+        unknown_level = level
+
+    # Chatty third-party loggers stay at WARNING unless explicitly changed
+    for name in ("urllib3", "socketio", "engineio", "PIL"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(log_queue, console_handler, respect_handler_level=False)
+    _listener.start()
+    if unknown_level is not None:
+        logging.getLogger(__name__).warning("Unknown log level %r, using INFO (choose from %s)", unknown_level, ", ".join(LEVEL_NAMES))
+
+
+def set_level(level):
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+    if not isinstance(level, int):
+        raise ValueError(f"Unknown log level: {level}")
+    logging.getLogger().setLevel(level)
+
+
+def get_level_name():
+    return logging.getLevelName(logging.getLogger().level)
+
+
+def shutdown_logging():
+    global _listener
+    if _listener:
+        _listener.stop() # Drains the queue
+        _listener = None
@@ -0,0 +1,182 @@
+# backend_health.py
+# Shared health model for the Node backend: one circuit breaker in front of every HTTP call
+# and a single background probe, instead of each button and loop finding out on its own.
+#
+# - While the backend is known to be down the breaker is open and calls fail immediately with
+#   BackendUnavailable (a requests ConnectionError, so existing error handling still applies)
+#   rather than each waiting out its own timeout.
+# - One probe thread checks GET /status: every `interval` seconds while the backend is up, with
+#   exponential backoff while it is down. The last /status payload is cached for UI checks.
+#   A successful probe (or any successful request) closes the breaker.
+# - Work deferred while the breaker is open is queued by key (repeated clicks queue it once)
+#   and handed to `dispatch` when the breaker closes.
+
+import logging
+import threading
+import time
+
+import requests
+from urllib3.exceptions import NewConnectionError
+
+log = logging.getLogger(__name__)
+
+
+class BackendUnavailable(requests.exceptions.ConnectionError):
+    """Raised without touching the network while the breaker is open."""
+
+
+def request_never_sent(error):
+    """True if a failed request provably never reached the backend, so resending it cannot duplicate it.
+
+    Only the breaker refusing it, a connect timeout or a refused connection qualify. An aborted or
+    reset connection may have been cut after the backend had already acted on the request.
+    """
+    if isinstance(error, (BackendUnavailable, requests.exceptions.ConnectTimeout)):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None # urllib3 MaxRetryError
+    return isinstance(reason, NewConnectionError)
+
+
+class BackendHealth:
+    def __init__(self, status_url, failure_threshold=2, interval=15.0, min_backoff=1.0, max_backoff=30.0,
+                 probe_timeout=2.0, on_change=None, dispatch=None):
+        self.status_url = status_url
+        self.failure_threshold = failure_threshold
+        self.interval = interval
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.probe_timeout = probe_timeout
+        self.on_change = on_change # (available: bool), called from whichever thread saw the change
+        self.dispatch = dispatch or (lambda fn: fn()) # Runs deferred work (e.g. on the Tk thread)
+        self.available = None # None = unknown (requests allowed), True = closed, False = open
+        self.last_status = None # Last /status payload seen by the probe
+        self.last_status_at = None # monotonic time of last_status
+        self.last_error = None
+        self.consecutive_failures = 0
+        self.trips = 0
+        self.fast_failures = 0 # Requests refused while open, i.e. timeouts not waited out
+        self.next_probe_at = None
+        self._backoff = min_backoff
+        self._deferred = {} # key -> callable, run in insertion order when the breaker closes
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._available_event = threading.Event()
+        self._available_event.set() # Unknown counts as available until proven otherwise
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def is_open(self):
+        return self.available is False
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running: return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="backend-health-probe", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def probe_now(self):
+        self._wake.set()
+
+    def retry_in(self):
+        return max(0.0, self.next_probe_at - time.monotonic()) if self.next_probe_at else 0.0
+
+    def cached_status(self, max_age):
+        """The probe's last /status payload if it is at most `max_age` seconds old, else None."""
+        if self.available and self.last_status is not None and time.monotonic() - self.last_status_at <= max_age:
+            return self.last_status
+        return None
+
+    def wait_until_available(self, timeout=None):
+        return self._available_event.wait(timeout)
+
+    # -- Breaker --
+    def check(self):
+        """Call before any backend request: raises BackendUnavailable while the breaker is open."""
+        if self.available is False:
+            self.fast_failures += 1
+            raise BackendUnavailable(f"Node backend unreachable ({self.last_error}); next check in {self.retry_in():.0f}s.")
+
+    def record_success(self, status=None):
+        with self._lock:
+            if status is not None:
+                self.last_status, self.last_status_at = status, time.monotonic()
+            self.consecutive_failures = 0
+            self._backoff = self.min_backoff
+            changed = self.available is not True
+            self.available = True
+            self._available_event.set()
+            deferred = list(self._deferred.values()) if changed else []
+            if changed: self._deferred.clear()
+        if changed:
+            log.info("Node backend reachable%s", f"; resuming {len(deferred)} queued task(s)" if deferred else "")
+            if self.on_change: self.on_change(True)
+            for fn in deferred:
+                self.dispatch(fn)
+
+    def record_failure(self, error, from_probe=False):
+        with self._lock:
+            already_open = self.available is False
+            self.consecutive_failures += 1
+            self.last_error = str(error) if not isinstance(error, requests.exceptions.ConnectionError) else type(error).__name__
+            tripped = self.available is not False and self.consecutive_failures >= self.failure_threshold
+            if tripped:
+                self.available = False
+                self.trips += 1
+                self._available_event.clear()
+        if tripped:
+            log.warning("Node backend unreachable (%s); failing fast until it is back", self.last_error)
+            if self.on_change: self.on_change(False)
+        if not from_probe and not already_open:
+            self._wake.set() # Let the probe confirm (or clear) the failure straight away
+
+    def defer(self, key, fn):
+        """Run `fn` when the backend is reachable (right away if it already is). Returns True if queued."""
+        with self._lock:
+            queued = self.available is False
+            if queued: self._deferred[key] = fn
+        if not queued:
+            self.dispatch(fn)
+        return queued
+
+    @property
+    def deferred_count(self):
+        return len(self._deferred)
+
+    # -- Probe --
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                response = requests.get(self.status_url, timeout=self.probe_timeout)
+                try:
+                    status = response.json()
+                except ValueError:
+                    status = {}
+                self.record_success(status) # Any HTTP answer means the server is up
+                delay = self.interval
+            except requests.exceptions.RequestException as e:
+                self.record_failure(e, from_probe=True)
+                with self._lock:
+                    delay = self._backoff if self.available is False else self.min_backoff
+                    if self.available is False:
+                        self._backoff = min(self._backoff * 2, self.max_backoff)
+            self.next_probe_at = time.monotonic() + delay
+            self._wake.wait(delay)
+            self._wake.clear()
+
+    def format_stats(self):
+        state = {None: "unknown", True: "up (breaker closed)", False: "DOWN (breaker open)"}[self.available]
+        lines = [
+            f"Node backend: {state}" + (f", next check in {self.retry_in():.0f}s" if self.available is False else ""),
+            f"Breaker trips: {self.trips}, requests failed fast: {self.fast_failures}, queued tasks: {self.deferred_count}",
+        ]
+        if self.last_error: lines.append(f"Last error: {self.last_error}")
+        return "\n".join(lines)
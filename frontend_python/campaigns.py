@@ -0,0 +1,204 @@
+# campaigns.py
+# Campaign rollups for one poll sent to many chats.
+# Every multi-chat send becomes a campaign that groups the per-chat poll message IDs. Combined
+# tallies are maintained incrementally: each member poll remembers the results it last
+# contributed, so a poll update only applies the per-option difference (O(options)) instead of
+# re-summing every member poll.
+#
+# Only the campaign structure (question, options, member polls, chat names/sizes) is saved to
+# disk; tallies are rebuilt from poll data as it arrives from the backend.
+
+import json
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+def poll_voter_count(poll):
+    # Full polls carry the voter map, summaries (paged sync / archive) only a count
+    return len(poll.get('voters') or {}) if 'voters' in poll else poll.get('voterCount', 0)
+
+
+class Campaign:
+    """One question sent to several chats, with combined and per-chat tallies."""
+
+    def __init__(self, campaign_id, question, options, created=None):
+        self.campaign_id = campaign_id
+        self.question = question
+        self.options = list(options)
+        self.created = created or time.time()
+        self.members = {} # pollMsgId -> {'chatId', 'name', 'audience'}
+        self.totals = {option: 0 for option in self.options}
+        self.total_voters = 0
+        self._audience = 0 # Sum of known chat sizes, kept up to date in add_poll
+        self._poll_results = {} # pollMsgId -> results last applied to the totals
+        self._poll_voters = {} # pollMsgId -> voter count last applied
+
+    def add_poll(self, poll_msg_id, chat_id, name=None, audience=None):
+        previous = self.members.get(poll_msg_id)
+        if previous and previous['audience']: self._audience -= previous['audience']
+        self.members[poll_msg_id] = {'chatId': chat_id, 'name': name or chat_id, 'audience': audience}
+        if audience: self._audience += audience
+
+    def apply(self, poll_msg_id, results, voter_count):
+        """Fold the latest results of one member poll into the totals. Returns True if anything changed."""
+        previous = self._poll_results.get(poll_msg_id, {})
+        changed = False
+        for option, count in results.items():
+            delta = count - previous.get(option, 0)
+            if delta:
+                self.totals[option] = self.totals.get(option, 0) + delta
+                changed = True
+        for option, count in previous.items():
+            if option not in results and count: # Option no longer reported; take its votes back out
+                self.totals[option] = self.totals.get(option, 0) - count
+                changed = True
+        voter_delta = voter_count - self._poll_voters.get(poll_msg_id, 0)
+        if voter_delta:
+            self.total_voters += voter_delta
+            changed = True
+        self._poll_results[poll_msg_id] = dict(results)
+        self._poll_voters[poll_msg_id] = voter_count
+        return changed
+
+    @property
+    def total_votes(self):
+        return sum(self.totals.values())
+
+    def option_share(self, option):
+        total = self.total_votes
+        return self.totals.get(option, 0) / total * 100 if total else 0.0
+
+    @property
+    def audience_size(self):
+        return self._audience or None
+
+    def breakdown(self):
+        """Per-chat rows ranked by participation (voters / audience when the chat size is known)."""
+        rows = []
+        for poll_msg_id, member in self.members.items():
+            results = self._poll_results.get(poll_msg_id, {})
+            voters = self._poll_voters.get(poll_msg_id, 0)
+            audience = member['audience']
+            rows.append({
+                'pollMsgId': poll_msg_id,
+                'chatId': member['chatId'],
+                'name': member['name'],
+                'votes': sum(results.values()),
+                'voters': voters,
+                'audience': audience,
+                'participation': voters / audience * 100 if audience else None,
+            })
+        rows.sort(key=lambda r: (r['participation'] if r['participation'] is not None else -1, r['voters']), reverse=True)
+        return rows
+
+    def format_report(self):
+        total = self.total_votes
+        audience = self.audience_size
+        lines = [
+            f"Campaign: {self.question}",
+            f"Created: {time.ctime(self.created)}",
+            f"Chats: {len(self.members)}, polls reporting: {sum(1 for v in self._poll_voters.values() if v)}",
+            f"Total voters: {self.total_voters}" + (f" of {audience} members ({self.total_voters / audience * 100:.1f}%)" if audience else ""),
+            "------------------------------------",
+            "Combined results:",
+        ]
+        for option in self.options:
+            lines.append(f"  - \"{option}\": {self.totals.get(option, 0)} votes ({self.option_share(option):.1f}%)")
+        lines.append(f"  Total votes: {total}")
+        lines.append("------------------------------------")
+        lines.append("Participation ranking (per chat):")
+        for rank, row in enumerate(self.breakdown(), 1):
+            rate = f"{row['participation']:.1f}% of {row['audience']}" if row['participation'] is not None else "size unknown"
+            lines.append(f"  {rank:>3}. {row['name']}: {row['voters']} voter(s), {row['votes']} vote(s) ({rate})")
+        return "\n".join(lines)
+
+    def to_dict(self):
+        return {'campaignId': self.campaign_id, 'question': self.question, 'options': self.options,
+                'created': self.created, 'members': self.members}
+
+    @classmethod
+    def from_dict(cls, data):
+        campaign = cls(data['campaignId'], data.get('question', ''), data.get('options', []), data.get('created'))
+        for poll_msg_id, member in (data.get('members') or {}).items():
+            campaign.add_poll(poll_msg_id, member.get('chatId'), member.get('name'), member.get('audience'))
+        return campaign
+
+
+class CampaignStore:
+    """All campaigns plus a pollMsgId -> campaign index, so a vote finds its campaign in O(1)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.campaigns = {} # campaign_id -> Campaign
+        self._by_poll = {} # pollMsgId -> Campaign
+        self._lock = threading.Lock() # Sends register polls from a worker thread, votes arrive on the Socket.IO thread
+
+    def create(self, question, options):
+        with self._lock:
+            campaign_id = f"c{int(time.time() * 1000)}"
+            while campaign_id in self.campaigns: campaign_id += "_"
+            campaign = self.campaigns[campaign_id] = Campaign(campaign_id, question, options)
+            return campaign
+
+    def add_poll(self, campaign_id, poll_msg_id, chat_id, name=None, audience=None):
+        with self._lock:
+            campaign = self.campaigns.get(campaign_id)
+            if campaign is None: return
+            campaign.add_poll(poll_msg_id, chat_id, name, audience)
+            self._by_poll[poll_msg_id] = campaign
+
+    def campaign_for_poll(self, poll_msg_id):
+        return self._by_poll.get(poll_msg_id)
+
+    def apply_poll(self, poll_msg_id, poll):
+        """Fold a poll's current results into its campaign. Returns the campaign if its totals changed."""
+        campaign = self._by_poll.get(poll_msg_id)
+        if campaign is None or not poll: return None
+        with self._lock:
+            changed = campaign.apply(poll_msg_id, poll.get('results') or {}, poll_voter_count(poll))
+        return campaign if changed else None
+
+    def delete(self, campaign_id):
+        with self._lock:
+            campaign = self.campaigns.pop(campaign_id, None)
+            if campaign:
+                for poll_msg_id in campaign.members:
+                    self._by_poll.pop(poll_msg_id, None)
+
+    def clear(self):
+        with self._lock:
+            self.campaigns.clear()
+            self._by_poll.clear()
+
+    def sorted_campaigns(self):
+        return sorted(self.campaigns.values(), key=lambda c: c.created, reverse=True)
+
+    def load(self):
+        if not os.path.exists(self.path): return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            log.error("Could not load campaigns from %s: %s", self.path, e)
+            return
+        with self._lock:
+            for entry in data.get('campaigns', []):
+                campaign = Campaign.from_dict(entry)
+                self.campaigns[campaign.campaign_id] = campaign
+                for poll_msg_id in campaign.members:
+                    self._by_poll[poll_msg_id] = campaign
+
+    def save(self):
+        with self._lock:
+            data = {'campaigns': [c.to_dict() for c in self.campaigns.values()]}
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            log.error("Could not save campaigns to %s: %s", self.path, e)
@@ -0,0 +1,453 @@
+# engine_worker.py
+# Optional separate process for the network and state engine (`python app.py --worker-process`).
+# The worker owns the Socket.IO client, HTTP paging of poll data, the poll store and the poll
+# send loop, so JSON decoding and vote bookkeeping no longer share the GIL with Tk. The worker
+# keeps voter maps only for polls whose map the GUI holds (so it can send voter changes); every
+# other poll is a summary with a voterCount, and its voters come from GET /poll/:id on demand.
+# The GUI's retention policy therefore bounds the worker too: archived polls are released. It is started as a plain subprocess (not multiprocessing spawn, which would re-run
+# app.py and open a second window) and talks to the GUI over an authenticated
+# multiprocessing.connection socket on loopback.
+#
+# Worker -> GUI (tuples, pickled by the connection):
+#   ('sio', event, args)           Socket.IO events forwarded as received (connect, qr_code, client_status, ...)
+#   ('poll_updates', [update])     poll_update_to_gui, coalesced to the latest update per poll every
+#                                  flush interval, with voterCount instead of the voter map. For polls
+#                                  whose voter map the GUI already holds, votersChanged {jid: hashes}
+#                                  and votersRemoved [jid] keep that copy current
+#   ('poll_page', data, full)      one /get-all-poll-data page; ('sync_done',) after the last one
+#   ('poll_voters', id, poll)      full poll (with voters) answering 'get_poll', poll None on failure
+#   ('chats', data)                /get-chats response
+#   ('status_data', data)          /status response answering 'check_status'
+#   ('status', text, color)        status line for the GUI
+#   ('worker_stats', stats)        poll store size and peak RSS of the worker, for Diagnostics
+#   ('http_log', method, url, status, body)
+#                                  raw backend HTTP response, sent while the GUI is capturing events
+#   ('send_result', job, chat, id) one successful send; ('send_done', job, success, failed) at the end
+#   ('http_result', id, status, reason, body, error)
+#                                  answer to an 'http' command; handled on the receiver thread
+# GUI -> worker: ('sync_polls', full, since, epoch, page_size), ('get_poll', id), ('fetch_chats',),
+#   ('release_voters', [id]), ('record_http', on), ('check_status',), ('http', id, method, url, kwargs, timeout),
+#   ('send', job, chat_ids, question, options, allow_multiple, delay_min, delay_max), ('stop',)
+#
+# The 'http' command lets the GUI's other backend calls (logout, recipient planner, server log
+# level) go through the worker too: EngineWorker.request() blocks the calling background thread
+# until the worker answers, so the GUI process itself never talks to the backend.
+
+import argparse
+import logging
+import os
+import queue
+import random
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+from urllib.parse import quote
+
+import requests
+import socketio
+
+import poll_archive
+
+log = logging.getLogger(__name__)
+
+AUTHKEY_ENV = "POLLMASTER_WORKER_KEY" # Passed through the environment, never on the command line
+FORWARDED_EVENTS = ('qr_code', 'client_status', 'whatsapp_user', 'new_poll_sent', 'initial_poll_data')
+STATS_INTERVAL_S = 5.0
+
+
+class EngineWorker:
+    """GUI side: starts the worker process and exchanges messages with it."""
+
+    def __init__(self, server_url, flush_interval=0.1, log_level="INFO"):
+        self.server_url = server_url
+        self.flush_interval = flush_interval
+        self.log_level = log_level
+        self.messages = queue.SimpleQueue() # Filled by the receiver thread, drained on the Tk thread
+        self.messages_received = 0
+        self._conn = None
+        self._pending = [] # Commands sent before the worker connected back
+        self._requests = {} # request id -> [Event, result] for request() calls waiting on the worker
+        self._request_seq = 0
+        self._lock = threading.Lock()
+        self._process = None
+        self._listener = None
+
+    @property
+    def running(self):
+        return self._process is not None and self._process.poll() is None
+
+    @property
+    def pid(self):
+        return self._process.pid if self._process else None
+
+    def start(self):
+        authkey = os.urandom(16)
+        self._listener = Listener(('127.0.0.1', 0), authkey=authkey)
+        host, port = self._listener.address
+        env = dict(os.environ, **{AUTHKEY_ENV: authkey.hex()})
+        self._process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--connect', f"{host}:{port}", '--server', self.server_url,
+             '--flush-ms', str(int(self.flush_interval * 1000)), '--log-level', self.log_level],
+            env=env)
+        threading.Thread(target=self._receive_loop, name="engine-worker-receiver", daemon=True).start()
+        log.info("Engine worker process started (pid %d)", self._process.pid)
+
+    def _receive_loop(self):
+        try:
+            conn = self._listener.accept()
+        except OSError as e:
+            log.error("Engine worker did not connect: %s", e)
+            self.messages.put(('worker_exit', self._process.poll()))
+            return
+        finally:
+            self._listener.close()
+        with self._lock:
+            self._conn = conn
+            for command in self._pending:
+                conn.send(command)
+            self._pending.clear()
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                break
+            self.messages_received += 1
+            if message[0] == 'http_result': # Wakes the thread blocked in request(), not the Tk queue
+                waiter = self._requests.get(message[1])
+                if waiter:
+                    waiter[1] = message[2:]
+                    waiter[0].set()
+                continue
+            self.messages.put(message)
+        with self._lock:
+            for waiter in self._requests.values(): # Nobody is left to answer them
+                waiter[0].set()
+        self.messages.put(('worker_exit', self._process.poll()))
+
+    def send_command(self, *command):
+        with self._lock:
+            if self._conn is None:
+                self._pending.append(command)
+                return
+            try:
+                self._conn.send(command)
+            except OSError as e:
+                log.warning("Could not send %r to the engine worker: %s", command[0], e)
+
+    def request(self, method, url, timeout=10, **kwargs):
+        """HTTP request made by the worker process. Blocks until it answers: never call from the Tk thread.
+
+        Returns a requests.Response; raises the same requests exceptions a direct call would.
+        """
+        if not self.running:
+            raise requests.exceptions.ConnectionError("Engine worker is not running.")
+        with self._lock:
+            self._request_seq += 1
+            request_id = self._request_seq
+            waiter = self._requests[request_id] = [threading.Event(), None]
+        try:
+            self.send_command('http', request_id, method, url, kwargs, timeout)
+            if not waiter[0].wait(timeout + 5) or waiter[1] is None:
+                raise requests.exceptions.ConnectionError("Engine worker did not answer the request.")
+        finally:
+            with self._lock:
+                self._requests.pop(request_id, None)
+        status_code, reason, body, error = waiter[1]
+        if error:
+            error_type, message = error
+            raise getattr(requests.exceptions, error_type, requests.exceptions.RequestException)(message)
+        response = requests.Response()
+        response.status_code, response.reason, response._content = status_code, reason, body
+        response.url, response.encoding = url, 'utf-8'
+        return response
+
+    def stop(self, timeout=5):
+        if not self._process: return
+        self.send_command('stop')
+        try:
+            self._process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self._process.terminate()
+        with self._lock:
+            if self._conn: self._conn.close()
+            self._conn = None
+
+
+class _Engine:
+    """Worker side: Socket.IO client, poll store and send loop, reporting to the GUI over `conn`."""
+
+    def __init__(self, conn, server_url, flush_interval):
+        self.conn = conn
+        self.server_url = server_url
+        self.flush_interval = flush_interval
+        self.polls = {} # pollMsgId -> poll; full polls keep their voter maps here, not in the GUI
+        self._gui_voter_maps = set() # pollMsgIds the GUI holds a voter map for; their updates carry voter changes
+        self.record_http = False # GUI event capture is on: report raw HTTP responses with 'http_log'
+        self._send_lock = threading.Lock()
+        self._pending_updates = {} # pollMsgId -> compact update waiting for the next flush
+        self._pending_lock = threading.Lock()
+        self._stop = threading.Event()
+        self.sio = socketio.Client(reconnection_attempts=10, reconnection_delay=3, logger=False, engineio_logger=False)
+        self.sio.on('connect', lambda: self.post('sio', 'connect', []))
+        self.sio.on('disconnect', lambda *args: self.post('sio', 'disconnect', []))
+        self.sio.on('connect_error', lambda data=None: self.post('sio', 'connect_error', [str(data)]))
+        self.sio.on('poll_update_to_gui', self._on_poll_update)
+        for event in FORWARDED_EVENTS:
+            self.sio.on(event, lambda *args, _event=event: self._on_forwarded(_event, args))
+
+    def post(self, *message):
+        with self._send_lock:
+            try:
+                self.conn.send(message)
+            except OSError:
+                self._stop.set() # GUI went away
+
+    # -- Socket.IO --
+    def _on_forwarded(self, event, args):
+        data = args[0] if args else None
+        if event == 'new_poll_sent' and isinstance(data, dict) and data.get('pollMsgId'):
+            with self._pending_lock:
+                self.polls[data['pollMsgId']] = data.get('pollData') or {}
+                self._gui_voter_maps.add(data['pollMsgId']) # Forwarded with its (empty) voter map
+        elif event == 'initial_poll_data' and isinstance(data, dict):
+            with self._pending_lock:
+                for poll_msg_id, poll in data.items():
+                    self._merge_summary(poll_msg_id, poll)
+        self.post('sio', event, list(args))
+
+    def _on_poll_update(self, data):
+        poll_msg_id = data.get('pollMsgId')
+        if not poll_msg_id: return
+        voters = data.get('voters') or {}
+        update = {k: v for k, v in data.items() if k != 'voters'}
+        update['voterCount'] = len(voters)
+        with self._pending_lock: # Also orders this against _get_poll handing a voter map to the GUI
+            poll = self.polls.setdefault(poll_msg_id, {})
+            previous = poll.get('voters') or {}
+            poll.update({k: v for k, v in data.items() if k not in ('pollMsgId', 'voters')})
+            if poll_msg_id not in self._gui_voter_maps: # Summary only; the voter map is not kept here
+                poll['voterCount'] = len(voters)
+            else: # Keep the map and send what changed, merged with any update not flushed yet
+                poll['voters'] = voters
+                poll.pop('voterCount', None)
+                pending = self._pending_updates.get(poll_msg_id) or {}
+                changed = dict(pending.get('votersChanged') or {})
+                removed = set(pending.get('votersRemoved') or ())
+                for jid in previous.keys() - voters.keys():
+                    changed.pop(jid, None)
+                    removed.add(jid)
+                for jid, selection in voters.items():
+                    if previous.get(jid) != selection:
+                        changed[jid] = selection
+                        removed.discard(jid)
+                update['votersChanged'], update['votersRemoved'] = changed, list(removed)
+            self._pending_updates[poll_msg_id] = update # Only the latest update per poll is sent
+
+    def _flush_loop(self):
+        next_stats = 0.0
+        while not self._stop.wait(self.flush_interval):
+            if time.monotonic() >= next_stats:
+                next_stats = time.monotonic() + STATS_INTERVAL_S
+                self.post('worker_stats', self.stats())
+            with self._pending_lock:
+                if not self._pending_updates: continue
+                updates, self._pending_updates = list(self._pending_updates.values()), {}
+            self.post('poll_updates', updates)
+
+    def stats(self):
+        with self._pending_lock:
+            held = [poll for poll in self.polls.values() if 'voters' in poll]
+            return {'polls': len(self.polls), 'voterMaps': len(held), 'voters': sum(len(poll['voters']) for poll in held),
+                    'peakRss': poll_archive.process_memory_bytes()}
+
+    def _connection_loop(self):
+        while not self._stop.is_set():
+            if not self.sio.connected:
+                try:
+                    self.sio.connect(self.server_url, wait_timeout=5)
+                except socketio.exceptions.ConnectionError as e:
+                    log.info("Socket.IO connection attempt failed (will retry): %s", e)
+                    self.post('sio', 'connect_error', [str(e)])
+                except Exception as e:
+                    log.exception("Unexpected error during Socket.IO connection attempt: %s", e)
+            self._stop.wait(10)
+
+    # -- Poll store --
+    def _merge_summary(self, poll_msg_id, summary):
+        current = self.polls.get(poll_msg_id)
+        if current is None or current.get('rev', -1) < summary.get('rev', 0):
+            self.polls[poll_msg_id] = dict(summary) # No voter map until someone opens the poll
+            self._gui_voter_maps.discard(poll_msg_id) # The GUI replaces its copy with the summary as well
+
+    def _release_voters(self, poll_msg_ids):
+        # The GUI archived these polls: drop their voter maps here too (back to summaries)
+        with self._pending_lock:
+            for poll_msg_id in poll_msg_ids:
+                self._gui_voter_maps.discard(poll_msg_id)
+                poll = self.polls.get(poll_msg_id)
+                if poll and 'voters' in poll:
+                    poll['voterCount'] = len(poll.pop('voters') or {})
+                    poll.pop('optionHashes', None)
+
+    def _sync_polls(self, full, since, epoch, page_size):
+        cursor = 0 if full else since
+        pages = 0
+        try:
+            while True:
+                response = requests.get(f"{self.server_url}/get-all-poll-data",
+                                        params={'limit': page_size, 'since': cursor, 'voters': '0'}, timeout=10)
+                self._log_http(response)
+                response.raise_for_status()
+                data = response.json()
+                legacy = 'latestRev' not in data # Backend without paging: complete poll dict
+                if legacy:
+                    full = True
+                elif pages == 0 and not full and (data.get('serverEpoch') != epoch or data.get('latestRev', 0) < cursor):
+                    full, cursor = True, 0
+                    continue
+                pages += 1
+                with self._pending_lock:
+                    for poll_msg_id, poll in (data.get('polls') or {}).items():
+                        if 'voters' in poll:
+                            self.polls[poll_msg_id] = poll
+                            self._gui_voter_maps.add(poll_msg_id)
+                        else: self._merge_summary(poll_msg_id, poll)
+                self.post('poll_page', data, full)
+                if legacy or not data.get('success') or data.get('nextCursor') is None:
+                    break
+                cursor = data['nextCursor']
+        except (requests.exceptions.RequestException, ValueError) as e:
+            log.warning("Error fetching poll data: %s", e)
+            self.post('status', f"Error fetching poll data (HTTP): {e}", "red")
+        finally:
+            self.post('sync_done')
+
+    def _get_poll(self, poll_msg_id):
+        poll = self.polls.get(poll_msg_id)
+        if poll is None or 'voters' not in poll:
+            try:
+                response = requests.get(f"{self.server_url}/poll/{quote(poll_msg_id, safe='')}", timeout=10)
+                self._log_http(response)
+                response.raise_for_status()
+                data = response.json()
+                poll = data.get('poll') if data.get('success') else None
+            except (requests.exceptions.RequestException, ValueError) as e:
+                log.warning("Could not fetch voters for poll %s: %s", poll_msg_id, e)
+                poll = None
+        with self._pending_lock: # Later updates for this poll carry voter changes relative to the copy sent here
+            if poll is not None:
+                current = self.polls.get(poll_msg_id) or {}
+                if 'voters' in current and current.get('rev', 0) >= poll.get('rev', 0):
+                    poll = current # A live update arrived while fetching
+                self.polls[poll_msg_id] = poll
+                self._gui_voter_maps.add(poll_msg_id)
+            self.post('poll_voters', poll_msg_id, poll)
+
+    def _log_http(self, response):
+        # The 'http' command is not logged here: its answer already reaches the GUI's recorder
+        if self.record_http:
+            self.post('http_log', response.request.method, response.url, response.status_code, response.text)
+
+    def _set_record_http(self, enabled):
+        self.record_http = enabled
+
+    def _check_status(self):
+        try:
+            response = requests.get(f"{self.server_url}/status", timeout=3)
+            self._log_http(response)
+            response.raise_for_status()
+            self.post('status_data', response.json())
+        except (requests.exceptions.RequestException, ValueError) as e:
+            log.warning("HTTP status check failed: %s", e)
+            self.post('status', f"Node server check failed: {type(e).__name__}", "red")
+
+    def _http(self, request_id, method, url, kwargs, timeout):
+        try:
+            response = requests.request(method, url, timeout=timeout, **kwargs)
+            self.post('http_result', request_id, response.status_code, response.reason, response.content, None)
+        except requests.exceptions.RequestException as e:
+            self.post('http_result', request_id, None, None, None, (type(e).__name__, str(e)))
+
+    def _fetch_chats(self):
+        try:
+            response = requests.get(f"{self.server_url}/get-chats", timeout=10)
+            self._log_http(response)
+            response.raise_for_status()
+            self.post('chats', response.json())
+        except (requests.exceptions.RequestException, ValueError) as e:
+            log.warning("Fetch chats error: %s", e)
+            self.post('status', f"Error fetching chats (HTTP): {e}", "red")
+
+    # -- Send engine --
+    def _send_polls(self, job_id, chat_ids, question, options, allow_multiple, delay_min, delay_max):
+        success_count = fail_count = 0
+        for i, chat_id in enumerate(chat_ids):
+            if self._stop.is_set(): break
+            self.post('status', f"Sending poll ({i+1}/{len(chat_ids)}) to {chat_id}...", "cyan")
+            try:
+                payload = {"chatId": chat_id, "question": question, "options": options, "allowMultipleAnswers": allow_multiple}
+                response = requests.post(f"{self.server_url}/send-poll", json=payload, timeout=15)
+                self._log_http(response)
+                response.raise_for_status()
+                result = response.json()
+                if result.get('success'):
+                    success_count += 1
+                    self.post('send_result', job_id, chat_id, result.get('pollMsgId'))
+                    self.post('status', f"Poll sent to {chat_id} (ID: {result.get('pollMsgId', 'N/A')})", "green")
+                else:
+                    fail_count += 1
+                    self.post('status', f"Failed poll to {chat_id}: {result.get('message', 'Unknown error')}", "red")
+                self._stop.wait(random.uniform(delay_min, delay_max)) # Anti-ban delay
+            except (requests.exceptions.RequestException, ValueError) as e:
+                fail_count += 1
+                log.warning("Poll send to %s failed: %s", chat_id, e)
+                self.post('status', f"Request Error poll to {chat_id}: {e}", "red")
+        self.post('send_done', job_id, success_count, fail_count)
+
+    # -- Main loop --
+    def run(self):
+        threading.Thread(target=self._flush_loop, name="update-flusher", daemon=True).start()
+        threading.Thread(target=self._connection_loop, name="sio-connection", daemon=True).start()
+        handlers = {'sync_polls': self._sync_polls, 'get_poll': self._get_poll, 'fetch_chats': self._fetch_chats,
+                    'release_voters': self._release_voters, 'record_http': self._set_record_http,
+                    'check_status': self._check_status,
+                    'http': self._http, 'send': self._send_polls}
+        while not self._stop.is_set():
+            try:
+                command = self.conn.recv()
+            except (EOFError, OSError):
+                break # GUI closed the connection
+            if command[0] == 'stop':
+                break
+            handler = handlers.get(command[0])
+            if handler:
+                threading.Thread(target=handler, args=command[1:], name=f"worker-{command[0]}", daemon=True).start()
+            else:
+                log.warning("Unknown engine worker command: %r", command[0])
+        self._stop.set()
+        if self.sio.connected: self.sio.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Poll Master engine worker (started by app.py --worker-process)")
+    parser.add_argument("--connect", required=True, help="HOST:PORT of the GUI's listener")
+    parser.add_argument("--server", required=True, help="Node backend URL")
+    parser.add_argument("--flush-ms", type=int, default=100)
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args()
+
+    import app_logging
+    app_logging.setup_logging(args.log_level)
+    host, port = args.connect.rsplit(':', 1)
+    conn = Client((host, int(port)), authkey=bytes.fromhex(os.environ[AUTHKEY_ENV]))
+    try:
+        _Engine(conn, args.server, args.flush_ms / 1000.0).run()
+    finally:
+        conn.close()
+        app_logging.shutdown_logging()
+
+
+if __name__ == "__main__":
+    main()
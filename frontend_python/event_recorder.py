@@ -0,0 +1,209 @@
+# event_recorder.py
+# Capture and replay of everything the backend sends to the GUI (Socket.IO events and HTTP
+# responses), plus per-event-type processing timings. Used to reproduce vote storms offline.
+#
+# Log format: one compact JSON object per line, append-only. A `.gz` suffix writes gzip
+# (gzip members can be appended, so a gzipped log stays append-only too).
+#   {"k":"hdr","v":1,"wall":<epoch secs>}                          - written when a capture starts
+#   {"t":<secs since capture start>,"k":"sio","e":<event>,"a":[args]}
+#   {"t":...,"k":"http","e":<path>,"m":<method>,"s":<status>,"b":<raw body text>}
+# A file can hold several captures, each starting with its own header; read_events() shifts
+# each one's times to continue where the previous capture ended.
+
+import collections
+import gzip
+import json
+import logging
+import queue
+import threading
+import time
+from urllib.parse import urlsplit
+
+LOG_FORMAT_VERSION = 1
+
+log = logging.getLogger(__name__)
+
+
+def _open_log(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+class EventRecorder:
+    """Append-only event log. Records are serialized on the calling thread (the app keeps and
+    mutates the received objects, so they must be captured as they arrived) and written by a
+    background thread."""
+
+    def __init__(self, path):
+        self.path = path
+        self.records_written = 0
+        self._start = time.monotonic()
+        self._queue = queue.Queue()
+        self._file = _open_log(path, 'a')
+        self.records_dropped = 0
+        self._write(_encode({'k': 'hdr', 'v': LOG_FORMAT_VERSION, 'wall': time.time()}))
+        self._writer = threading.Thread(target=self._writer_loop, name="event-recorder", daemon=True)
+        self._writer.start()
+
+    def record_sio(self, event, args):
+        self._put({'t': round(time.monotonic() - self._start, 6), 'k': 'sio', 'e': event, 'a': list(args)})
+
+    def record_http(self, method, url, status, body_text):
+        self._put({'t': round(time.monotonic() - self._start, 6), 'k': 'http', 'e': urlsplit(url).path,
+                   'm': method, 's': status, 'b': body_text})
+
+    def _put(self, record):
+        try:
+            line = _encode(record)
+        except (TypeError, ValueError, RuntimeError) as e: # RuntimeError: payload changed by another thread mid-dump
+            self.records_dropped += 1
+            log.error("Event recorder could not serialize %s:%s: %s", record['k'], record['e'], e)
+            return
+        self._queue.put(line)
+
+    def close(self):
+        self._queue.put(None)
+        self._writer.join(timeout=5)
+
+    def _write(self, line):
+        self._file.write(line)
+        self._file.write('\n')
+
+    def _writer_loop(self):
+        while True:
+            line = self._queue.get()
+            if line is None:
+                break
+            try:
+                self._write(line)
+                self.records_written += 1
+                if self._queue.empty():
+                    self._file.flush()  # Flush when idle so a crash loses as little as possible
+            except Exception as e:
+                log.error("Event recorder write error: %s", e)
+        self._file.close()
+
+
+def _encode(record):
+    return json.dumps(record, separators=(',', ':'), ensure_ascii=False, default=str)
+
+
+def read_events(path):
+    """Yield recorded events (header lines skipped). A truncated final line is ignored.
+
+    Times of each appended capture are offset by the last time of the one before, so `t`
+    never goes backwards across headers.
+    """
+    offset = last_t = 0.0
+    with _open_log(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get('k') == 'hdr':
+                offset = last_t # The next capture's clock restarts at 0
+            elif record.get('k') in ('sio', 'http'):
+                record['t'] = last_t = offset + record.get('t', 0)
+                yield record
+
+
+class EventTimings:
+    """Per event type processing stats: count, total, max and percentiles over a recent window."""
+
+    def __init__(self, window=1024):
+        self._window = window
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def add(self, key, seconds):
+        with self._lock:
+            stat = self._stats.get(key)
+            if stat is None:
+                stat = self._stats[key] = {'count': 0, 'total': 0.0, 'max': 0.0,
+                                           'recent': collections.deque(maxlen=self._window)}
+            stat['count'] += 1
+            stat['total'] += seconds
+            if seconds > stat['max']:
+                stat['max'] = seconds
+            stat['recent'].append(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for key, stat in self._stats.items():
+                recent = sorted(stat['recent'])
+                result[key] = {
+                    'count': stat['count'],
+                    'mean_ms': stat['total'] / stat['count'] * 1000,
+                    'p50_ms': recent[len(recent) // 2] * 1000 if recent else 0.0,
+                    'p95_ms': recent[min(len(recent) - 1, int(len(recent) * 0.95))] * 1000 if recent else 0.0,
+                    'max_ms': stat['max'] * 1000,
+                    'total_s': stat['total'],
+                }
+            return result
+
+    def format_report(self):
+        snapshot = self.snapshot()
+        if not snapshot:
+            return "No events processed yet."
+        lines = [f"{'Event':<34}{'Count':>8}{'Mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'Max ms':>10}{'Total s':>10}"]
+        for key, stat in sorted(snapshot.items(), key=lambda item: item[1]['total_s'], reverse=True):
+            lines.append(f"{key:<34}{stat['count']:>8}{stat['mean_ms']:>10.2f}{stat['p50_ms']:>10.2f}"
+                         f"{stat['p95_ms']:>10.2f}{stat['max_ms']:>10.2f}{stat['total_s']:>10.3f}")
+        return "\n".join(lines)
+
+
+class EventReplayer:
+    """Feeds a recording back through `dispatch(record)` at `speed`x real time (0 = max speed)."""
+
+    def __init__(self, path, dispatch, speed=1.0, on_finished=None):
+        self.path = path
+        self.dispatch = dispatch
+        self.speed = speed
+        self.on_finished = on_finished
+        self.events_replayed = 0
+        self.max_lag = 0.0  # Worst delay behind the recorded schedule (client could not keep up)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="event-replayer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        started = time.monotonic()
+        error = None
+        try:
+            for record in read_events(self.path):
+                if self._stop.is_set():
+                    break
+                if self.speed and self.speed > 0:
+                    due = started + record.get('t', 0) / self.speed
+                    wait = due - time.monotonic()
+                    if wait > 0:
+                        if self._stop.wait(wait):
+                            break
+                    else:
+                        self.max_lag = max(self.max_lag, -wait)
+                try:
+                    self.dispatch(record)
+                except Exception as e:
+                    log.warning("Replay dispatch error for %s:%s: %s", record.get('k'), record.get('e'), e)
+                self.events_replayed += 1
+        except Exception as e:
+            error = e
+        elapsed = time.monotonic() - started
+        if self.on_finished:
+            self.on_finished(self.events_replayed, elapsed, self.max_lag, error)
@@ -0,0 +1,275 @@
+# local_api.py
+# Read-only local HTTP API + Server-Sent Events stream of poll results, served from the GUI's
+# own poll state. Any number of dashboards can watch results through one upstream Socket.IO
+# subscription instead of each opening its own connection to the Node/Baileys process.
+#
+#   GET /health             -> {"success": true, "version": N, "subscribers": N}
+#   GET /polls              -> {"success": true, "version": N, "polls": [summary, ...]}
+#   GET /polls/<pollMsgId>  -> {"success": true, "version": N, "poll": summary}
+#   GET /events             -> text/event-stream of poll_update / poll_added / polls_reset
+#
+# Every change bumps a version number. JSON bodies are rendered at most once per version and
+# path and carry ETag "<epoch>-<version>" (epoch = when this server was started, since versions
+# restart at 0), so polling dashboards get cheap 304s via If-None-Match.
+#
+# Requests whose Host header is not loopback are refused (DNS rebinding), and CORS headers are
+# only sent to origins in `allowed_origins`, so arbitrary web pages cannot read poll data.
+
+import json
+import logging
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+log = logging.getLogger(__name__)
+
+SSE_KEEPALIVE_SECONDS = 15
+SSE_SUBSCRIBER_QUEUE_SIZE = 1000 # A dashboard this far behind is dropped and will reconnect
+LOOPBACK_HOSTS = ('127.0.0.1', 'localhost', '::1')
+
+
+def poll_summary(poll_msg_id, poll):
+    results = poll.get('results') or {}
+    total_votes = sum(v for v in results.values() if isinstance(v, (int, float)))
+    return {
+        'pollMsgId': poll_msg_id,
+        'question': poll.get('question'),
+        'options': poll.get('options', []),
+        'results': results,
+        'totalVotes': total_votes,
+        'voterCount': len(poll['voters']) if 'voters' in poll else poll.get('voterCount', 0),
+        'timestamp': poll.get('timestamp'),
+        'chatId': poll.get('chatId'),
+        'selectableCount': poll.get('selectableCount', 1),
+    }
+
+
+class LocalResultsAPI:
+    """Threaded HTTP server; `get_polls()` must return the current {pollMsgId: poll} dict."""
+
+    def __init__(self, get_polls, host="127.0.0.1", port=8765, allowed_origins=()):
+        self.get_polls = get_polls
+        self.host = host
+        self.port = port
+        self.allowed_origins = frozenset(origin.rstrip("/") for origin in allowed_origins)
+        self.epoch = format(int(time.time() * 1000), "x")
+        self.version = 0
+        self._lock = threading.Lock()
+        self._cache = {} # path -> (version, body bytes)
+        self._subscribers = set()
+        self._server = None
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._server is not None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        api = self
+        class Handler(_RequestHandler):
+            pass
+        Handler.api = api
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1] # Port 0 picks a free port
+        self._thread = threading.Thread(target=self._server.serve_forever, name="local-results-api", daemon=True)
+        self._thread.start()
+        log.info("Local results API listening on %s", self.url)
+
+    def stop(self):
+        if not self._server: return
+        server, self._server = self._server, None
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self._subscribers.clear()
+        for subscriber in subscribers:
+            _drain_and_close(subscriber) # Ends the SSE loops; never blocks on a full queue
+        server.shutdown()
+        server.server_close()
+        log.info("Local results API stopped")
+
+    # -- Called by the app whenever poll state changes --
+    def publish(self, event, data):
+        with self._lock:
+            self.version += 1
+            self._cache.clear()
+            message = _sse_message(event, data, self.version)
+            dropped = []
+            for subscriber in self._subscribers:
+                try:
+                    subscriber.put_nowait(message)
+                except queue.Full:
+                    dropped.append(subscriber)
+            for subscriber in dropped:
+                self._subscribers.discard(subscriber)
+                _drain_and_close(subscriber)
+        if dropped:
+            log.warning("Dropped %d slow SSE subscriber(s)", len(dropped))
+
+    # -- Used by the request handler --
+    def render(self, path):
+        """Returns (status, version, body bytes), cached per version."""
+        with self._lock:
+            version = self.version
+            cached = self._cache.get(path)
+        if cached and cached[0] == version:
+            return 200, version, cached[1]
+
+        polls = self.get_polls()
+        if path == "/polls":
+            summaries = [poll_summary(pid, poll) for pid, poll in list(polls.items())]
+            summaries.sort(key=lambda p: p['timestamp'] if isinstance(p['timestamp'], (int, float)) else 0, reverse=True)
+            status, payload = 200, {'success': True, 'version': version, 'polls': summaries}
+        elif path.startswith("/polls/"):
+            poll_msg_id = unquote(path[len("/polls/"):])
+            poll = polls.get(poll_msg_id)
+            if poll is None:
+                return 404, version, _json_bytes({'success': False, 'message': 'Poll not found.'})
+            status, payload = 200, {'success': True, 'version': version, 'poll': poll_summary(poll_msg_id, poll)}
+        elif path == "/health":
+            with self._lock:
+                subscriber_count = len(self._subscribers)
+            return 200, version, _json_bytes({'success': True, 'version': version, 'subscribers': subscriber_count})
+        else:
+            return 404, version, _json_bytes({'success': False, 'message': 'Unknown endpoint.'})
+
+        body = _json_bytes(payload)
+        with self._lock:
+            if self.version == version: # Don't cache a body that is already stale
+                self._cache[path] = (version, body)
+        return status, version, body
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=SSE_SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            version = self.version
+        return subscriber, version
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+
+def _json_bytes(payload):
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _sse_message(event, data, event_id):
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}\n\n".encode('utf-8')
+
+
+def _drain_and_close(subscriber):
+    try:
+        while True: subscriber.get_nowait()
+    except queue.Empty:
+        pass
+    subscriber.put_nowait(None)
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    api = None # Set on the per-server subclass
+    protocol_version = "HTTP/1.1"
+    server_version = "PollMasterLocalAPI"
+
+    def log_message(self, format, *args):
+        log.debug("%s - %s", self.address_string(), format % args)
+
+    def _send_common_headers(self):
+        origin = self.headers.get("Origin")
+        if origin and origin.rstrip("/") in self.api.allowed_origins:
+            self.send_header("Access-Control-Allow-Origin", origin)
+        self.send_header("Vary", "Origin")
+
+    def _host_allowed(self):
+        host = self.headers.get("Host")
+        if not host: return False
+        try:
+            hostname = urlsplit(f"//{host}").hostname
+        except ValueError:
+            return False
+        return hostname in LOOPBACK_HOSTS
+
+    def do_GET(self):
+        if not self._host_allowed(): # A rebound DNS name pointing at 127.0.0.1 still carries its own Host
+            body = _json_bytes({'success': False, 'message': 'Host not allowed.'})
+            self.send_response(403)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        path = urlsplit(self.path).path.rstrip("/") or "/"
+        if path == "/events":
+            return self._serve_events()
+        status, version, body = self.api.render(path)
+        etag = f'"{self.api.epoch}-{version}"'
+        if status == 200 and etag in [t.strip() for t in self.headers.get("If-None-Match", "").split(",")]:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self._send_common_headers()
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if status == 200:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache") # May be cached, but revalidate with the ETag
+        self._send_common_headers()
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.send_response(405)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _reject_write(self):
+        body = _json_bytes({'success': False, 'message': 'Read-only API.'})
+        self.send_response(405)
+        self.send_header("Allow", "GET")
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_POST = do_PUT = do_PATCH = do_DELETE = _reject_write
+
+    def _serve_events(self):
+        subscriber, version = self.api.subscribe()
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "keep-alive")
+            self._send_common_headers()
+            self.end_headers()
+            # Tell the dashboard which version it is starting from; it fetches /polls for the full state
+            self.wfile.write(_sse_message("hello", {'version': version}, version))
+            self.wfile.flush()
+            while True:
+                try:
+                    message = subscriber.get(timeout=SSE_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    message = b": keepalive\n\n"
+                if message is None:
+                    break
+                self.wfile.write(message)
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError, OSError):
+            pass # Dashboard went away
+        finally:
+            self.api.unsubscribe(subscriber)
+            self.close_connection = True
@@ -0,0 +1,192 @@
+# poll_archive.py
+# Bounded-memory retention for the GUI's poll store.
+# Cold polls (least recently active) are written to disk and replaced in memory by a small
+# summary row (question, options, counts - no voter map). The full poll is loaded back
+# lazily when it is opened in the Results tab or receives a new vote.
+
+import json
+import logging
+import os
+import re
+import sys
+import time
+
+try:
+    import resource # Unix only; used for the process memory figure in diagnostics
+except ImportError:
+    resource = None
+
+log = logging.getLogger(__name__)
+
+SUMMARY_FIELDS = ('question', 'options', 'results', 'timestamp', 'selectableCount', 'chatId', 'rev') # rev keeps syncs from replacing unchanged archived rows
+
+
+class RetentionPolicy:
+    """Limits for polls kept fully in memory. None disables a limit."""
+
+    def __init__(self, max_polls=200, max_age_hours=24, max_memory_mb=50):
+        self.max_polls = max_polls
+        self.max_age_seconds = max_age_hours * 3600 if max_age_hours else None
+        self.max_memory_bytes = int(max_memory_mb * 1024 * 1024) if max_memory_mb else None
+
+
+def _deep_sizeof(obj):
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k) + _deep_sizeof(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(_deep_sizeof(item) for item in obj)
+    return size
+
+
+def estimate_poll_bytes(poll, voter_sample=20):
+    # Exact sizing of a big voter map is as expensive as the map itself, so measure the poll
+    # without voters and extrapolate the voter map from a small sample.
+    voters = poll.get('voters') or {}
+    base = _deep_sizeof({k: v for k, v in poll.items() if k != 'voters'})
+    if not voters:
+        return base
+    sample = []
+    for i, item in enumerate(voters.items()):
+        if i >= voter_sample: break
+        sample.append(_deep_sizeof(item[0]) + _deep_sizeof(item[1]))
+    return base + sys.getsizeof(voters) + len(voters) * (sum(sample) // len(sample))
+
+
+def make_summary(poll):
+    summary = {field: poll[field] for field in SUMMARY_FIELDS if field in poll}
+    summary['voterCount'] = len(poll.get('voters') or {}) if 'voters' in poll else poll.get('voterCount', 0)
+    summary['archived'] = True
+    return summary
+
+
+def process_memory_bytes():
+    if resource is None: return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024 # Linux reports KiB, macOS bytes
+
+
+class PollArchive:
+    """One JSON file per archived poll."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, poll_id):
+        return os.path.join(self.directory, re.sub(r'[^A-Za-z0-9_.-]', '_', poll_id) + '.json')
+
+    def save(self, poll_id, poll):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(poll_id)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(poll, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path) # Atomic, a crash never leaves a half-written archive
+
+    def load(self, poll_id):
+        try:
+            with open(self._path(poll_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def clear(self):
+        if not os.path.isdir(self.directory): return
+        for name in os.listdir(self.directory):
+            if name.endswith('.json') or name.endswith('.tmp'):
+                try: os.remove(os.path.join(self.directory, name))
+                except OSError: pass
+
+    def disk_usage(self):
+        if not os.path.isdir(self.directory): return 0, 0
+        files = [os.path.join(self.directory, n) for n in os.listdir(self.directory) if n.endswith('.json')]
+        return len(files), sum(os.path.getsize(f) for f in files if os.path.exists(f))
+
+
+class RetentionManager:
+    """Decides which polls go cold and swaps them between memory and the archive."""
+
+    def __init__(self, archive, policy):
+        self.archive = archive
+        self.policy = policy
+        self.last_activity = {} # poll_id -> epoch secs of last vote/open
+        self.hot_bytes = 0
+        self.archived_total = 0
+        self.reloaded_total = 0
+
+    def touch(self, poll_id):
+        self.last_activity[poll_id] = time.time()
+
+    def _activity(self, poll_id, poll):
+        if poll_id in self.last_activity:
+            return self.last_activity[poll_id]
+        ts = poll.get('timestamp')
+        return ts / 1000 if isinstance(ts, (int, float)) and ts > 0 else 0
+
+    def enforce(self, polls, pinned=()):
+        """Archive cold polls in `polls` (mutated in place). Returns the archived poll IDs."""
+        hot = [(pid, poll) for pid, poll in list(polls.items()) if not poll.get('archived') and pid not in pinned]
+        hot.sort(key=lambda item: self._activity(*item)) # Coldest first
+        sizes = {pid: estimate_poll_bytes(poll) for pid, poll in hot}
+        pinned_polls = [polls[pid] for pid in pinned if pid in polls and not polls[pid].get('archived')]
+        total_bytes = sum(sizes.values()) + sum(estimate_poll_bytes(poll) for poll in pinned_polls)
+        now = time.time()
+
+        to_archive = []
+        remaining = len(hot) + len(pinned_polls)
+        for pid, poll in hot:
+            too_old = self.policy.max_age_seconds and now - self._activity(pid, poll) > self.policy.max_age_seconds
+            too_many = self.policy.max_polls is not None and remaining > self.policy.max_polls
+            too_big = self.policy.max_memory_bytes is not None and total_bytes > self.policy.max_memory_bytes
+            if not (too_old or too_many or too_big):
+                break # Everything after this is warmer
+            to_archive.append(pid)
+            remaining -= 1
+            total_bytes -= sizes[pid]
+
+        archived = []
+        for pid in to_archive:
+            poll = polls.get(pid)
+            if poll is None or poll.get('archived'): continue
+            try:
+                self.archive.save(pid, poll)
+            except OSError as e:
+                log.error("Could not archive poll %s: %s", pid, e)
+                continue
+            polls[pid] = make_summary(poll)
+            self.last_activity.pop(pid, None)
+            archived.append(pid)
+        self.archived_total += len(archived)
+        self.hot_bytes = total_bytes
+        return archived
+
+    def reload(self, polls, poll_id):
+        """Bring an archived poll back into memory. Returns the full poll (or the summary if the file is gone)."""
+        summary = polls.get(poll_id)
+        if not summary or not summary.get('archived'):
+            return summary
+        full = self.archive.load(poll_id)
+        if full is None:
+            return summary
+        polls[poll_id] = full
+        self.reloaded_total += 1
+        self.touch(poll_id)
+        return full
+
+    def format_stats(self, polls):
+        archived_count = sum(1 for poll in list(polls.values()) if poll.get('archived'))
+        files, disk_bytes = self.archive.disk_usage()
+        process_bytes = process_memory_bytes()
+        limits = self.policy
+        lines = [
+            f"Polls in memory: {len(polls) - archived_count} full, {archived_count} archived summaries",
+            f"Estimated poll store memory: {self.hot_bytes / 1024:.1f} KiB"
+            + (f" (limit {limits.max_memory_bytes / 1024 / 1024:.0f} MiB)" if limits.max_memory_bytes else ""),
+            f"Retention limits: max polls {limits.max_polls or 'none'}, "
+            f"max age {f'{limits.max_age_seconds / 3600:g} h' if limits.max_age_seconds else 'none'}",
+            f"Archive on disk: {files} poll(s), {disk_bytes / 1024:.1f} KiB in '{self.archive.directory}'",
+            f"Archived this session: {self.archived_total}, lazily reloaded: {self.reloaded_total}",
+        ]
+        if process_bytes:
+            lines.append(f"Process peak RSS: {process_bytes / 1024 / 1024:.1f} MiB")
+        return "\n".join(lines)
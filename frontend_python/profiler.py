@@ -0,0 +1,151 @@
+# profiler.py
+# Opt-in sampling profiler and a Tk main-thread stall watchdog.
+#
+# SamplingProfiler periodically snapshots the stacks of every Python thread (Tk main thread,
+# Socket.IO/engine.io threads, worker threads) with sys._current_frames() and aggregates them
+# in "folded" format (`thread;outer;...;inner <count>`), which flamegraph.pl, speedscope and
+# inferno read directly.
+#
+# StallWatchdog has Tk bump a heartbeat every few ms through root.after(); a separate thread
+# notices when the heartbeat stops for longer than the threshold and captures the main
+# thread's stack at that moment, i.e. whatever is blocking the event loop.
+
+import collections
+import os
+import sys
+import threading
+import time
+import traceback
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _folded_stack(frame):
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse() # Folded format is root first
+    return labels
+
+
+class SamplingProfiler:
+    """Samples all threads every `interval` seconds until stopped."""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.samples = 0
+        self.started_at = None
+        self._counts = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running: return
+        self._stop.clear()
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        main_ident = threading.main_thread().ident
+        names = {}
+        while not self._stop.wait(self.interval):
+            if self.samples % 100 == 0: # Thread names rarely change; refresh now and then
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident: continue
+                thread_name = "MainThread (Tk)" if ident == main_ident else names.get(ident, f"thread-{ident}")
+                stack = _folded_stack(frame)
+                self._counts[";".join([thread_name] + stack)] += 1
+            self.samples += 1
+
+    def stop(self, path):
+        """Stop sampling and write the folded stacks to `path`. Returns the number of distinct stacks."""
+        self._stop.set()
+        if self._thread: self._thread.join(timeout=2)
+        self._thread = None
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self._counts.most_common():
+                f.write(f"{stack.replace(' ', '_')} {count}\n") # Spaces separate the count in folded format
+        distinct = len(self._counts)
+        self._counts.clear()
+        return distinct
+
+
+class StallWatchdog:
+    """Reports when the Tk event loop has not run for more than `threshold_ms`."""
+
+    def __init__(self, root, threshold_ms=500, on_stall=None, on_recovered=None):
+        self.root = root
+        self.threshold = threshold_ms / 1000.0
+        self.on_stall = on_stall # (stalled_seconds, main_thread_stack_text), called from the watchdog thread
+        self.on_recovered = on_recovered # (total_stall_seconds)
+        self.stall_count = 0
+        self.longest_stall = 0.0
+        self.last_stack = None
+        self._main_ident = threading.main_thread().ident
+        self._last_beat = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running: return
+        self._stop.clear()
+        self._last_beat = time.monotonic()
+        self._beat()
+        self._thread = threading.Thread(target=self._watch, name="tk-stall-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _beat(self):
+        # Runs on the Tk thread; if this stops firing, the event loop is blocked
+        if self._stop.is_set(): return
+        self._last_beat = time.monotonic()
+        beat_ms = max(10, int(self.threshold * 1000 / 5))
+        try:
+            self.root.after(beat_ms, self._beat)
+        except Exception: # Root destroyed
+            self._stop.set()
+
+    def _watch(self):
+        in_stall = False
+        stall_duration = 0.0
+        while not self._stop.wait(self.threshold / 4):
+            stalled_for = time.monotonic() - self._last_beat
+            if stalled_for > self.threshold:
+                if not in_stall: # Capture the stack once per stall, as early as possible
+                    in_stall = True
+                    self.stall_count += 1
+                    frame = sys._current_frames().get(self._main_ident)
+                    self.last_stack = "".join(traceback.format_stack(frame)) if frame else "(main thread stack unavailable)"
+                    if self.on_stall: self.on_stall(stalled_for, self.last_stack)
+                stall_duration = stalled_for
+                self.longest_stall = max(self.longest_stall, stalled_for)
+            elif in_stall:
+                in_stall = False
+                if self.on_recovered: self.on_recovered(stall_duration)
+
+    def format_stats(self):
+        lines = [
+            f"Stall watchdog: {'on' if self.running else 'off'} (threshold {self.threshold * 1000:.0f} ms)",
+            f"Stalls detected: {self.stall_count}, longest: {self.longest_stall * 1000:.0f} ms",
+        ]
+        if self.last_stack:
+            lines.append("Main thread stack at last stall:")
+            lines.append(self.last_stack.rstrip())
+        return "\n".join(lines)
@@ -0,0 +1,210 @@
+# recipient_planner.py
+# Audience planning for multi-group poll sends.
+# Groups often share members, so sending one poll to every selected group reaches the
+# same people many times. The planner works out reach/overlap and picks a small set of
+# groups that still covers the wanted audience.
+#
+# Member sets are stored compactly: every member JID is interned to a small integer and
+# each group becomes a Python int used as a bitset (bit i set = member i is in the group).
+# Union/intersection/difference are then single big-int operations and counting is a
+# popcount, which keeps thousands of groups x tens of thousands of members cheap.
+
+import heapq
+
+try:
+    (0).bit_count  # Python 3.10+
+    def _popcount(mask):
+        return mask.bit_count()
+except AttributeError:  # Older Pythons
+    def _popcount(mask):
+        return bin(mask).count("1")
+
+
+class AudienceIndex:
+    """Interned member JIDs + one bitset per group."""
+
+    def __init__(self):
+        self._member_index = {}  # member jid -> bit position
+        self._members = []       # bit position -> member jid
+        self.group_masks = {}    # group jid -> int bitset of members
+        self.group_names = {}    # group jid -> display name
+
+    @classmethod
+    def from_chats(cls, chats):
+        # chats: list of dicts as returned by /get-chats?participants=1
+        index = cls()
+        for chat in chats or []:
+            if chat.get('isGroup') and chat.get('id') and chat.get('participants') is not None:
+                index.add_group(chat['id'], chat['participants'], chat.get('name'))
+        return index
+
+    def add_group(self, group_id, member_jids, name=None):
+        bits = []
+        for jid in member_jids:
+            bit = self._member_index.get(jid)
+            if bit is None:
+                bit = len(self._members)
+                self._member_index[jid] = bit
+                self._members.append(jid)
+            bits.append(bit)
+        # Build the bitset in a bytearray; OR-ing `1 << bit` one member at a time would copy
+        # the whole (growing) int on every step.
+        buf = bytearray((max(bits) >> 3) + 1 if bits else 0)
+        for bit in bits:
+            buf[bit >> 3] |= 1 << (bit & 7)
+        self.group_masks[group_id] = int.from_bytes(buf, 'little')
+        self.group_names[group_id] = name or group_id
+
+    def __contains__(self, group_id):
+        return group_id in self.group_masks
+
+    @property
+    def member_count(self):
+        return len(self._members)
+
+    def size(self, group_id):
+        return _popcount(self.group_masks.get(group_id, 0))
+
+    def union_mask(self, group_ids):
+        mask = 0
+        for gid in group_ids:
+            mask |= self.group_masks.get(gid, 0)
+        return mask
+
+    def reach(self, group_ids):
+        # Number of distinct people reached by sending to all of group_ids
+        return _popcount(self.union_mask(group_ids))
+
+    def pair_overlap(self, group_a, group_b):
+        return _popcount(self.group_masks.get(group_a, 0) & self.group_masks.get(group_b, 0))
+
+    def members_of(self, mask):
+        bits = bin(mask)[:1:-1]  # Least significant bit first
+        return [self._members[i] for i, flag in enumerate(bits) if flag == '1']
+
+    def overlap_report(self, group_ids):
+        """Reach plus per-group shared/exclusive member counts, in a single linear pass."""
+        group_ids = [gid for gid in group_ids if gid in self.group_masks]
+        masks = [self.group_masks[gid] for gid in group_ids]
+
+        # Prefix/suffix unions give "union of every other group" without an O(n^2) loop
+        prefix = [0] * (len(masks) + 1)
+        for i, mask in enumerate(masks):
+            prefix[i + 1] = prefix[i] | mask
+        suffix = [0] * (len(masks) + 1)
+        for i in range(len(masks) - 1, -1, -1):
+            suffix[i] = suffix[i + 1] | masks[i]
+
+        per_group = []
+        total_deliveries = 0
+        for i, gid in enumerate(group_ids):
+            mask = masks[i]
+            others = prefix[i] | suffix[i + 1]
+            size = _popcount(mask)
+            shared = _popcount(mask & others)
+            total_deliveries += size
+            per_group.append({
+                'id': gid,
+                'name': self.group_names.get(gid, gid),
+                'size': size,
+                'shared': shared,
+                'exclusive': size - shared,
+            })
+
+        reach = _popcount(prefix[-1])
+        return {
+            'groups': per_group,
+            'reach': reach,
+            'total_deliveries': total_deliveries,
+            'duplicate_deliveries': total_deliveries - reach,
+        }
+
+    def greedy_cover(self, candidate_ids, target_mask=None, coverage=1.0):
+        """Pick groups from candidate_ids until `coverage` of the target audience is reached.
+
+        Standard greedy set cover (best ln(n) approximation) using a lazy max-heap: a group's
+        marginal gain can only shrink as more people get covered, so a stale heap entry is
+        simply re-scored and pushed back instead of rescanning every group each round.
+        """
+        candidate_ids = [gid for gid in candidate_ids if gid in self.group_masks]
+        if target_mask is None:
+            target_mask = self.union_mask(candidate_ids)
+        target_size = _popcount(target_mask)
+        needed = target_size if coverage >= 1.0 else int(target_size * max(coverage, 0.0) + 0.999999)
+
+        heap = []
+        for order, gid in enumerate(candidate_ids):
+            gain = _popcount(self.group_masks[gid] & target_mask)
+            if gain:
+                # order breaks ties so the caller's ordering (e.g. listbox order) is stable
+                heap.append((-gain, order, gid))
+        heapq.heapify(heap)
+
+        uncovered = target_mask
+        covered = 0
+        chosen = []
+        while heap and covered < needed:
+            neg_gain, order, gid = heapq.heappop(heap)
+            gain = _popcount(self.group_masks[gid] & uncovered)
+            if gain == 0:
+                continue
+            if heap and gain < -heap[0][0]:
+                heapq.heappush(heap, (-gain, order, gid))  # Stale score, re-queue
+                continue
+            uncovered &= ~self.group_masks[gid]
+            covered += gain
+            chosen.append({'id': gid, 'name': self.group_names.get(gid, gid), 'new_members': gain})
+
+        return {
+            'chosen': chosen,
+            'target_size': target_size,
+            'covered': covered,
+            'uncovered_mask': uncovered,
+        }
+
+
+def plan_recipients(index, candidate_ids, coverage=1.0):
+    """Full plan for sending one poll to candidate_ids: overlap stats + greedy minimal group set."""
+    overlap = index.overlap_report(candidate_ids)
+    cover = index.greedy_cover(candidate_ids, coverage=coverage)
+    # No participant data for these (e.g. direct chats); they are always kept in the send list
+    missing = [gid for gid in candidate_ids if gid not in index]
+    chosen_ids = [c['id'] for c in cover['chosen']]
+    return {
+        'overlap': overlap,
+        'cover': cover,
+        'chosen_ids': chosen_ids,
+        'missing_ids': missing,
+        'send_ids': chosen_ids + missing,
+        'sends_saved': len(candidate_ids) - len(chosen_ids) - len(missing),
+    }
+
+
+def format_plan(plan, coverage=1.0, max_rows=25):
+    overlap = plan['overlap']
+    cover = plan['cover']
+    target = cover['target_size']
+    lines = [
+        f"Selected groups: {len(overlap['groups'])}",
+        f"Unique people reached (reach): {overlap['reach']}",
+        f"Total deliveries if sent to all: {overlap['total_deliveries']}",
+        f"Duplicate deliveries (overlap): {overlap['duplicate_deliveries']}",
+        "------------------------------------",
+        f"Planned groups for {coverage * 100:.0f}% coverage: {len(cover['chosen'])} "
+        f"(saves {plan['sends_saved']} send(s))",
+        f"Covered: {cover['covered']} / {target}"
+        f" ({(cover['covered'] / target * 100) if target else 0:.1f}%)",
+    ]
+    for i, chosen in enumerate(cover['chosen'][:max_rows]):
+        lines.append(f"  {i + 1}. {chosen['name']}  (+{chosen['new_members']} new)")
+    if len(cover['chosen']) > max_rows:
+        lines.append(f"  ... and {len(cover['chosen']) - max_rows} more")
+    if plan['missing_ids']:
+        lines.append(f"(No participant data for {len(plan['missing_ids'])} selected chat(s); they are sent to as-is.)")
+
+    lines.append("------------------------------------")
+    lines.append("Most overlapping selected groups (shared / size):")
+    by_shared = sorted(overlap['groups'], key=lambda g: (g['shared'], g['size']), reverse=True)
+    for g in by_shared[:10]:
+        lines.append(f"  - {g['name']}: {g['shared']} / {g['size']} shared, {g['exclusive']} exclusive")
+    return "\n".join(lines)